@@ -1,4 +1,9 @@
 from .handlers import BotHandlers
 from .keyboards import BotKeyboards
+from .sender import OutboundSender
+from .concurrency import PerUserUpdateProcessor
+from .persistence import SQLitePersistence
+from .sessions import BookingSession, MemorySessionStore, SQLiteSessionStore
 
-__all__ = ['BotHandlers', 'BotKeyboards']
\ No newline at end of file
+__all__ = ['BotHandlers', 'BotKeyboards', 'OutboundSender', 'PerUserUpdateProcessor',
+           'BookingSession', 'MemorySessionStore', 'SQLiteSessionStore', 'SQLitePersistence']
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+from contextlib import nullcontext
+from itertools import takewhile
+from typing import Any, Awaitable, Dict, Optional, Set
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.metrics import METRICS_ENABLED, UPDATE_SECONDS, UPDATES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений обрабатывается одновременно (для разных пользователей)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+# Сколько обновлений одного пользователя может ждать своей очереди; лишние отбрасываются
+USER_MAX_PENDING_UPDATES = int(os.getenv('USER_MAX_PENDING_UPDATES', '8'))
+
+# Команды, зарегистрированные в main.py; остальной текст с '/' попадает в одну
+# метку command_other, иначе число меток метрики не ограничено
+METRIC_COMMANDS = frozenset({'/start', '/help', '/mybookings', '/stats'})
+
+
+class _UserSlot:
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+def update_kind(update: object) -> str:
+    """Тип обновления для метрик: команда, тип кнопки без параметров или message"""
+    if not isinstance(update, Update):
+        return 'other'
+    if update.callback_query and update.callback_query.data:
+        # select_date_2024-05-01 -> select_date
+        parts = update.callback_query.data.split('_')
+        return '_'.join(takewhile(lambda part: not part[:1].isdigit(), parts)) or 'callback'
+    message = update.effective_message
+    if message and message.text and message.text.startswith('/'):
+        command = message.text.split()[0].split('@')[0].lower()
+        return command if command in METRIC_COMMANDS else 'command_other'
+    return 'message'
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка для пользователя
+
+    Обновления разных пользователей обрабатываются одновременно, а обновления
+    одного пользователя - строго по очереди (asyncio.Lock отдает блокировку
+    в порядке ожидания). Поэтому сессии записи не требуют дополнительной
+    синхронизации, и медленный запрос к Google задерживает только своего
+    пользователя.
+
+    Application снимает обновление с update_queue сразу и ждет семафор уже
+    в отдельной задаче, поэтому размер очереди не отражает нагрузку. Источник
+    обновлений (webhook) регистрирует принятое обновление через track(), а
+    pending_updates показывает, сколько из них еще не обработано.
+    """
+
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES,
+                 max_pending_per_user: int = USER_MAX_PENDING_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self.max_pending_per_user = max_pending_per_user
+        self._slots: Dict[int, _UserSlot] = {}
+        # update_id принятых, но еще не обработанных обновлений
+        self._tracked: Set[int] = set()
+
+    @property
+    def pending_updates(self) -> int:
+        """Число зарегистрированных через track() и еще не обработанных обновлений"""
+        return len(self._tracked)
+
+    def track(self, update: Update):
+        """Учет обновления до постановки в update_queue; снимается после обработки"""
+        self._tracked.add(update.update_id)
+
+    @staticmethod
+    def _user_key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await self._process_in_order(update, coroutine)
+        finally:
+            if isinstance(update, Update):
+                self._tracked.discard(update.update_id)
+
+    async def _process_in_order(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Время ожидания своей очереди в метрику не входит, таймер запускается под блокировкой
+        timer = UPDATE_SECONDS.time(update_kind(update)) if METRICS_ENABLED else nullcontext()
+        key = self._user_key(update)
+        if key is None:
+            with timer:
+                await coroutine
+            return
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _UserSlot()
+
+        # Ожидающие обновления занимают общие слоты обработки, поэтому
+        # один пользователь не должен занять их все
+        if slot.pending >= self.max_pending_per_user:
+            logger.warning("Слишком много необработанных обновлений от %s, обновление пропущено", key)
+            UPDATES_DROPPED.inc('user_pending_limit')
+            coroutine.close()
+            return
+
+        slot.pending += 1
+        try:
+            async with slot.lock:
+                with timer:
+                    await coroutine
+        finally:
+            slot.pending -= 1
+            if slot.pending == 0:
+                del self._slots[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._slots.clear()
+        self._tracked.clear()
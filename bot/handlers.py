@@ -1,30 +1,40 @@
+import os
 import logging
-from typing import Dict
-from datetime import datetime
+from typing import Optional
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from config import SERVICE_NAME, SERVICE_PRICE_RUB, MESSAGES, ADMIN_CONTACT, PHONE_NUMBER
-from database.manager import DatabaseManager, Booking
-from calendar_api.manager import GoogleCalendarManager
+from config import MESSAGES, ADMIN_CONTACT, PHONE_NUMBER
 from services.booking import BookingService
+from services.catalog import SERVICES, DEFAULT_SERVICE, Service, get_service
 from .keyboards import BotKeyboards
+from .sender import OutboundSender
+from .sessions import BookingSession, create_session_store
 from utils.helpers import format_date, format_booking_list
+from utils.metrics import registry as metrics_registry
+from utils.profiling import profile_slow_updates
 
 logger = logging.getLogger(__name__)
 
+# Telegram id пользователей, которым доступна команда /stats (через запятую)
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+
 class BotHandlers:
     """Класс обработчиков команд бота"""
 
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None, calendar_manager=None):
         self.keyboards = BotKeyboards()
-        self.booking_service = BookingService()
-        self.user_sessions: Dict[int, Dict] = {}  # Сессии пользователей
+        self.sender = OutboundSender()
+        self.booking_service = BookingService(
+            sender=self.sender, db_path=db_path, calendar_manager=calendar_manager
+        )
+        # Сессии незавершенных записей (TTL, хранилище по SESSION_BACKEND)
+        self.sessions = create_session_store(self.booking_service.db)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         user = update.effective_user
-        logger.info(f"Пользователь {user.id} ({user.username}) запустил бота")
+        logger.info("Пользователь %s (%s) запустил бота", user.id, user.username)
 
         await update.message.reply_text(
             MESSAGES['welcome'],
@@ -41,12 +51,12 @@ class BotHandlers:
             "/mybookings - Мои записи\n\n"
             "💡 <b>Как записаться:</b>\n"
             "1. Нажмите «Записаться на консультацию»\n"
-            "2. Выберите удобную дату\n"
+            "2. Выберите услугу и удобную дату\n"
             "3. Выберите время\n"
             "4. Укажите контактную информацию\n"
             "5. Подтвердите запись\n"
             "6. Оплата производится администратору\n\n"
-            f"💰 <b>Стоимость:</b> {SERVICE_PRICE_RUB} руб.\n"
+            f"💰 <b>Стоимость:</b> {self._price_list()}\n"
             f"📞 <b>Администратор:</b> {ADMIN_CONTACT}\n"
             f"📱 <b>Телефон:</b> {PHONE_NUMBER}"
         )
@@ -66,10 +76,30 @@ class BotHandlers:
                 reply_markup=self.keyboards.back_to_main()
             )
 
+    @staticmethod
+    def _price_list() -> str:
+        """Цена единственной услуги или прайс-лист"""
+        if len(SERVICES) == 1:
+            return f"{DEFAULT_SERVICE.price} руб."
+        return "\n" + "\n".join(
+            f"• {service.name} ({service.duration_minutes} мин) - {service.price} руб."
+            for service in SERVICES
+        )
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /stats (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_USER_IDS:
+            return
+
+        await update.message.reply_text(
+            f"📊 <b>Метрики</b>\n\n{metrics_registry.render_summary()}",
+            parse_mode='HTML'
+        )
+
     async def my_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать будущие записи пользователя"""
         user = update.effective_user
-        bookings = self.booking_service.get_user_future_bookings(user.id)
+        bookings = await self.booking_service.get_user_future_bookings(user.id)
 
         # Всегда создаем новый текст и клавиатуру
         new_text = "📋 У вас пока нет записей на консультации." if not bookings else \
@@ -100,11 +130,20 @@ class BotHandlers:
                     await query.answer("Ваши записи уже отображены")
 
         except Exception as e:
-            logger.error(f"Ошибка отображения записей: {e}")
+            logger.error("Ошибка отображения записей: %s", e)
             if not update.message:
                 await update.callback_query.answer("Произошла ошибка", show_alert=True)
 
-    async def show_available_dates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_services(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показать список услуг"""
+        query = update.callback_query
+        await query.edit_message_text(
+            "🧾 Выберите услугу:",
+            reply_markup=self.keyboards.services_keyboard(list(SERVICES))
+        )
+
+    async def show_available_dates(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                   service: Service = DEFAULT_SERVICE):
         """Показать доступные даты с улучшенной диагностикой"""
         query = update.callback_query
         # Обновляем сообщение с состоянием обработки
@@ -114,8 +153,8 @@ class BotHandlers:
             )
         try:
             logger.info("Запрос доступных слотов...")
-            available_slots = self.booking_service.get_available_slots()
-            logger.info(f"Получено слотов: {len(available_slots)}")
+            available_slots = await self.booking_service.get_available_slots(service)
+            logger.info("Получено слотов: %s", len(available_slots))
 
             if not available_slots:
                 logger.warning("Нет доступных слотов")
@@ -144,17 +183,15 @@ class BotHandlers:
                     dates[date] = []
                 dates[date].append(slot)
 
-            logger.info(f"Сгруппировано по датам: {list(dates.keys())}")
+            logger.info("Сгруппировано по датам: %s", list(dates.keys()))
 
             await query.edit_message_text(
                 "📅 Выберите удобную дату:",
-                reply_markup=self.keyboards.dates_keyboard(dates)
+                reply_markup=self.keyboards.dates_keyboard(dates, service.key)
             )
 
         except Exception as e:
-            logger.error(f"Ошибка получения доступных дат: {e}")
-            import traceback
-            logger.error(f"Полная трассировка: {traceback.format_exc()}")
+            logger.exception("Ошибка получения доступных дат: %s", e)
 
             await query.edit_message_text(
                 "❌ Произошла ошибка при загрузке доступных дат.\n"
@@ -167,7 +204,9 @@ class BotHandlers:
         query = update.callback_query
         await query.answer()
 
-        date = query.data.split('_')[-1]
+        # Формат callback_data: select_date_<услуга>_YYYY-MM-DD (у старых кнопок без услуги)
+        *service_key, date = query.data[len('select_date_'):].split('_')
+        service = get_service(service_key[0] if service_key else None)
         date_formatted = format_date(date)
 
         try:
@@ -178,7 +217,7 @@ class BotHandlers:
         )
 
         # Получаем доступные слоты (может занять время)
-            available_slots = self.booking_service.get_available_slots()
+            available_slots = await self.booking_service.get_available_slots(service)
             times = [slot for slot in available_slots if slot.date == date]
 
             if not times:
@@ -190,11 +229,11 @@ class BotHandlers:
             # Показываем доступное время
             await query.edit_message_text(
                 f"🕐 Выберите время на {date_formatted}:",
-                reply_markup=self.keyboards.times_keyboard(date, times)
+                reply_markup=self.keyboards.times_keyboard(date, times, service.key)
             )
 
         except Exception as e:
-            logger.error(f"Ошибка получения доступного времени: {e}")
+            logger.error("Ошибка получения доступного времени: %s", e)
             await query.edit_message_text(
                 "❌ Произошла ошибка при загрузке времени. Попробуйте позже.",
                 reply_markup=self.keyboards.back_to_main()
@@ -206,14 +245,16 @@ class BotHandlers:
         await query.answer()
 
         try:
-            # Разбираем callback_data (формат: select_time_YYYY-MM-DD_HH-MM)
-            _, _, date, time_part = query.data.split('_', 3)
+            # Разбираем callback_data (формат: select_time_<услуга>_YYYY-MM-DD_HH-MM,
+            # у старых кнопок без услуги)
+            *service_key, date, time_part = query.data[len('select_time_'):].split('_')
+            service = get_service(service_key[0] if service_key else None)
             # Преобразуем HH-MM обратно в HH:MM
             time = time_part.replace("-", ":")
             user = update.effective_user
 
             # Проверяем, не занят ли слот
-            if self.booking_service.is_slot_taken(date, time):
+            if await self.booking_service.is_slot_taken(date, time, service):
                 await query.edit_message_text(
                     "😔 К сожалению, этот слот уже занят. Выберите другое время.",
                     reply_markup=self.keyboards.back_to_main()
@@ -221,37 +262,40 @@ class BotHandlers:
                 return
 
             # Сохраняем данные в сессии пользователя
-            self.user_sessions[user.id] = {
-                'date': date,
-                'time': time,
-                'username': user.username or user.first_name,
-                'waiting_for_contact': True
-            }
+            await self.sessions.save(BookingSession(
+                user_id=user.id,
+                username=user.username or user.first_name,
+                date=date,
+                time=time,
+                service=service.key
+            ))
 
             date_formatted = format_date(date)
 
             await query.edit_message_text(
                 f"📋 <b>Предварительная запись:</b>\n\n"
+                f"🧾 Услуга: {service.name} ({service.duration_minutes} мин)\n"
                 f"📅 Дата: {date_formatted}\n"
                 f"🕐 Время: {time}\n"
-                f"💰 Стоимость: {SERVICE_PRICE_RUB} руб.\n\n"
+                f"💰 Стоимость: {service.price} руб.\n\n"
                 f"{MESSAGES['ask_contact']}",
                 parse_mode='HTML'
             )
 
         except Exception as e:
-            logger.error(f"Ошибка подготовки записи: {e}")
+            logger.error("Ошибка подготовки записи: %s", e)
             await query.edit_message_text(
                 "❌ Произошла ошибка. Попробуйте снова.",
                 reply_markup=self.keyboards.back_to_main()
             )
 
+    @profile_slow_updates
     async def handle_contact_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка контактной информации"""
         user = update.effective_user
-        session_data = self.user_sessions.get(user.id)
+        session = await self.sessions.get(user.id)
 
-        if not session_data or not session_data.get('waiting_for_contact'):
+        if not session or not session.waiting_for_contact:
             return  # Игнорируем, если пользователь не в процессе записи
 
         contact_info = update.message.text.strip()
@@ -267,17 +311,20 @@ class BotHandlers:
             return
 
         # Обновляем сессию
-        session_data['contact_info'] = contact_info
-        session_data['waiting_for_contact'] = False
+        session.contact_info = contact_info
+        session.waiting_for_contact = False
+        await self.sessions.save(session)
 
-        date_formatted = format_date(session_data['date'])
+        date_formatted = format_date(session.date)
+        service = get_service(session.service)
 
         confirmation_text = (
             f"📋 <b>Подтверждение записи:</b>\n\n"
+            f"🧾 Услуга: {service.name} ({service.duration_minutes} мин)\n"
             f"📅 Дата: {date_formatted}\n"
-            f"🕐 Время: {session_data['time']}\n"
+            f"🕐 Время: {session.time}\n"
             f"👤 Контакт: {contact_info}\n\n"
-            f"💰 Стоимость: {SERVICE_PRICE_RUB} руб.\n"
+            f"💰 Стоимость: {service.price} руб.\n"
             f"💳 Оплата производится администратору: {ADMIN_CONTACT}\n"
             f"📱 Телефон: {PHONE_NUMBER}\n\n"
             f"Подтвердите создание записи:"
@@ -286,7 +333,7 @@ class BotHandlers:
         await update.message.reply_text(
             confirmation_text,
             parse_mode='HTML',
-            reply_markup=self.keyboards.booking_confirmation(session_data['date'])
+            reply_markup=self.keyboards.booking_confirmation(session.date, service.key)
         )
 
     async def confirm_booking(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -295,37 +342,38 @@ class BotHandlers:
         await query.answer()
 
         user = update.effective_user
-        session_data = self.user_sessions.get(user.id)
+        session = await self.sessions.get(user.id)
 
-        if not session_data or not session_data.get('contact_info'):
+        if not session or not session.contact_info:
             await query.edit_message_text(
                 "❌ Ошибка: данные бронирования не найдены. Начните заново.",
                 reply_markup=self.keyboards.back_to_main()
             )
             return
 
+        service = get_service(session.service)
+
         try:
             # Создаем запись
             booking_result = await self.booking_service.create_booking(
                 user_id=user.id,
-                username=session_data['username'],
-                date=session_data['date'],
-                time=session_data['time'],
-                contact_info=session_data['contact_info']
+                username=session.username,
+                date=session.date,
+                time=session.time,
+                contact_info=session.contact_info,
+                service=service
             )
 
             if booking_result['success']:
-                # Планируем напоминания
-                await self.schedule_reminders(context, booking_result['booking'], booking_result['booking_id'])
-
-                date_formatted = format_date(session_data['date'])
+                # Напоминания сохранены вместе с записью, их отправит ReminderDispatcher
+                date_formatted = format_date(session.date)
 
                 await query.edit_message_text(
                     MESSAGES['booking_success'].format(
                         date=date_formatted,
-                        time=session_data['time'],
-                        contact=session_data['contact_info'],
-                        price=SERVICE_PRICE_RUB,
+                        time=session.time,
+                        contact=session.contact_info,
+                        price=service.price,
                         admin_contact=ADMIN_CONTACT,
                         phone=PHONE_NUMBER
                     ),
@@ -334,7 +382,12 @@ class BotHandlers:
                 )
 
                 # Очищаем сессию
-                del self.user_sessions[user.id]
+                await self.sessions.delete(user.id)
+            elif booking_result.get('slot_taken'):
+                await query.edit_message_text(
+                    "😔 К сожалению, этот слот уже занят. Выберите другое время.",
+                    reply_markup=self.keyboards.back_to_main()
+                )
             else:
                 await query.edit_message_text(
                     MESSAGES['booking_error'],
@@ -342,51 +395,13 @@ class BotHandlers:
                 )
 
         except Exception as e:
-            logger.error(f"Ошибка создания записи: {e}")
+            logger.error("Ошибка создания записи: %s", e)
             await query.edit_message_text(
                 MESSAGES['booking_error'],
                 reply_markup=self.keyboards.back_to_main()
             )
 
-    async def schedule_reminders(self, context: ContextTypes.DEFAULT_TYPE, booking: Booking, booking_id: int):
-        """Планирование напоминаний"""
-        from utils.helpers import schedule_booking_reminders
-        await schedule_booking_reminders(context, booking, booking_id)
-
-    async def send_day_reminder(self, context: ContextTypes.DEFAULT_TYPE):
-        """Отправка напоминания за день"""
-        booking_data = context.job.data
-        booking = booking_data['booking']
-
-        date_formatted = format_date(booking.date)
-
-        await context.bot.send_message(
-            chat_id=booking.user_id,
-            text=f"📅 <b>Напоминание!</b>\n\n"
-                 f"Завтра у вас запланирована консультация:\n"
-                 f"🗓 Дата: {date_formatted}\n"
-                 f"🕐 Время: {booking.time}\n\n"
-                 f"💰 Стоимость: {SERVICE_PRICE_RUB} руб.\n"
-                 f"💳 Оплата администратору: {ADMIN_CONTACT}\n"
-                 f"📱 Телефон: {PHONE_NUMBER}\n\n"
-                 f"До встречи!",
-            parse_mode='HTML'
-        )
-
-    async def send_hour_reminder(self, context: ContextTypes.DEFAULT_TYPE):
-        """Отправка напоминания за час"""
-        booking_data = context.job.data
-        booking = booking_data['booking']
-
-        await context.bot.send_message(
-            chat_id=booking.user_id,
-            text=f"⏰ <b>Напоминание!</b>\n\n"
-                 f"Через час у вас консультация:\n"
-                 f"🕐 Время: {booking.time}\n\n"
-                 f"Увидимся скоро!",
-            parse_mode='HTML'
-        )
-
+    @profile_slow_updates
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Общий обработчик кнопок с улучшенной обработкой ошибок"""
         query = update.callback_query
@@ -395,12 +410,18 @@ class BotHandlers:
         try:
             await query.answer()
         except Exception as e:
-            logger.warning(f"Не удалось ответить на callback query: {e}")
+            logger.warning("Не удалось ответить на callback query: %s", e)
         # Продолжаем выполнение, это не критично
 
         try:
             if query.data == 'book_appointment':
-                await self.show_available_dates(update, context)
+                # При единственной услуге шаг выбора услуги пропускается
+                if len(SERVICES) > 1:
+                    await self.show_services(update, context)
+                else:
+                    await self.show_available_dates(update, context)
+            elif query.data.startswith('select_service_'):
+                await self.show_available_dates(update, context, get_service(query.data[len('select_service_'):]))
             elif query.data == 'processing':
                 await query.answer("Идёт обработка вашего запроса...")
             elif query.data.startswith('select_date_'):
@@ -416,18 +437,17 @@ class BotHandlers:
             elif query.data == 'back_to_main':
                 # Очищаем сессию пользователя при возврате в главное меню
                 user = update.effective_user
-                if user.id in self.user_sessions:
-                    del self.user_sessions[user.id]
+                await self.sessions.delete(user.id)
 
                 await query.edit_message_text(
                     MESSAGES['welcome'],
                     reply_markup=self.keyboards.main_menu()
                 )
             else:
-                logger.warning(f"Неизвестная команда: {query.data}")
+                logger.warning("Неизвестная команда: %s", query.data)
 
         except Exception as e:
-            logger.error(f"Ошибка обработки кнопки {query.data}: {e}")
+            logger.error("Ошибка обработки кнопки %s: %s", query.data, e)
             try:
                 await query.edit_message_text(
                     "❌ Произошла ошибка. Возвращаюсь в главное меню.",
@@ -3,6 +3,7 @@ from datetime import datetime
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from database.models import TimeSlot
+from services.catalog import Service
 
 class BotKeyboards:
     """Класс для создания клавиатур бота"""
@@ -20,7 +21,20 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def dates_keyboard(dates: Dict[str, List]) -> InlineKeyboardMarkup:
+    def services_keyboard(services: List[Service]) -> InlineKeyboardMarkup:
+        """Клавиатура выбора услуги"""
+        keyboard = [
+            [InlineKeyboardButton(
+                f"{service.name} - {service.duration_minutes} мин, {service.price} руб.",
+                callback_data=f'select_service_{service.key}'
+            )]
+            for service in services
+        ]
+        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_main')])
+        return InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    def dates_keyboard(dates: Dict[str, List], service_key: str) -> InlineKeyboardMarkup:
         """Клавиатура с доступными датами"""
         keyboard = []
 
@@ -34,13 +48,13 @@ class BotKeyboards:
             }
 
             date_str = f"{date_obj.strftime('%d.%m')} ({weekdays[date_obj.weekday()]}) - {len(slots)} слотов"
-            keyboard.append([InlineKeyboardButton(date_str, callback_data=f'select_date_{date}')])
+            keyboard.append([InlineKeyboardButton(date_str, callback_data=f'select_date_{service_key}_{date}')])
 
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_main')])
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def times_keyboard(date: str, times: List[TimeSlot]) -> InlineKeyboardMarkup:
+    def times_keyboard(date: str, times: List[TimeSlot], service_key: str) -> InlineKeyboardMarkup:
         """Клавиатура с доступным временем"""
         keyboard = []
 
@@ -52,7 +66,7 @@ class BotKeyboards:
             row.append(InlineKeyboardButton(
                 f"🕐 {time_str}",
                 #callback_data=f'select_time_{date}_{time_str}'
-                callback_data=f'select_time_{date}_{time_str.replace(":", "-")}'
+                callback_data=f'select_time_{service_key}_{date}_{time_str.replace(":", "-")}'
             ))
 
             if len(row) == 3:
@@ -64,7 +78,7 @@ class BotKeyboards:
             keyboard.append(row)
 
         keyboard.append([
-            InlineKeyboardButton("◀️ Назад к датам", callback_data='book_appointment')
+            InlineKeyboardButton("◀️ Назад к датам", callback_data=f'select_service_{service_key}')
         ])
         return InlineKeyboardMarkup(keyboard)
     '''@staticmethod
@@ -97,11 +111,11 @@ class BotKeyboards:
     ])
 
     @staticmethod
-    def booking_confirmation(date: str) -> InlineKeyboardMarkup:
+    def booking_confirmation(date: str, service_key: str) -> InlineKeyboardMarkup:
         """Клавиатура подтверждения записи"""
         keyboard = [
             [InlineKeyboardButton("✅ Подтвердить запись", callback_data='confirm_booking')],
-            [InlineKeyboardButton("◀️ Изменить время", callback_data=f'select_date_{date}')],
+            [InlineKeyboardButton("◀️ Изменить время", callback_data=f'select_date_{service_key}_{date}')],
             [InlineKeyboardButton("❌ Отмена", callback_data='back_to_main')]
         ]
         return InlineKeyboardMarkup(keyboard)
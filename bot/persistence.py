@@ -0,0 +1,264 @@
+import os
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database.manager import SQLITE_PRAGMAS
+
+logger = logging.getLogger(__name__)
+
+# Файл с данными Application (user_data, chat_data, bot_data, состояния диалогов)
+PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', 'bot_persistence.db')
+# Период записи измененных данных (секунды)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '60'))
+# Сколько пользователей и чатов помнить как загруженные и записанные
+PERSISTENCE_CACHE_SIZE = int(os.getenv('PERSISTENCE_CACHE_SIZE', '100000'))
+# Файл прежней PicklePersistence; импортируется один раз в пустую БД
+LEGACY_PERSISTENCE_PATH = os.getenv('LEGACY_PERSISTENCE_PATH', 'bot_persistence')
+
+
+class _LRU(OrderedDict):
+    """Словарь ограниченного размера, вытесняющий давно не использованные ключи"""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def touch(self, key: Any, value: Any = True):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def _digest(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+class SQLitePersistence(BasePersistence):
+    """Персистентность Application в SQLite с построчной записью
+
+    В отличие от PicklePersistence, которая каждый раз переписывает весь файл,
+    сохраняется только строка измененного пользователя или чата, причем
+    неизменившиеся данные не записываются. user_data и chat_data загружаются
+    лениво - при первом обновлении от пользователя или чата, поэтому время
+    запуска не зависит от их общего числа. Как следствие, application.user_data
+    содержит только пользователей, встреченных после запуска.
+
+    Отметки о загрузке и дайджесты записанных строк хранятся для последних
+    cache_size пользователей и чатов. Вытеснение безопасно: лишняя запись
+    повторит ту же строку, а повторная загрузка не перезаписывает данные в памяти.
+    """
+
+    def __init__(self, filepath: str = PERSISTENCE_PATH,
+                 store_data: Optional[PersistenceInput] = None,
+                 update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+                 cache_size: int = PERSISTENCE_CACHE_SIZE,
+                 legacy_path: Optional[str] = LEGACY_PERSISTENCE_PATH):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self._conn: Optional[sqlite3.Connection] = None
+        # Один поток - одно соединение и строгий порядок записей
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistence')
+        self.legacy_path = legacy_path
+        self._loaded_users = _LRU(cache_size)
+        self._loaded_chats = _LRU(cache_size)
+        # Дайджест последней записанной версии строки, чтобы не писать то же самое
+        self._written = _LRU(cache_size)
+
+    # --- Работа с SQLite (выполняется в потоке персистентности) ---
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.filepath)
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL)')
+                conn.execute('CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL)')
+                conn.execute('CREATE TABLE IF NOT EXISTS kv_data (key TEXT PRIMARY KEY, data BLOB NOT NULL)')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS conversations (
+                        name TEXT NOT NULL,
+                        key BLOB NOT NULL,
+                        state BLOB NOT NULL,
+                        PRIMARY KEY (name, key)
+                    )
+                ''')
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        """Однократный перенос данных из файла PicklePersistence в пустую БД"""
+        if not self.legacy_path or not os.path.isfile(self.legacy_path):
+            return
+        conn = self._conn
+        for table in ('user_data', 'chat_data', 'kv_data', 'conversations'):
+            if conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+                return
+
+        try:
+            with open(self.legacy_path, 'rb') as file:
+                legacy = pickle.load(file)
+        except Exception as e:
+            logger.error("Не удалось прочитать %s: %s", self.legacy_path, e)
+            return
+
+        dump = partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL)
+        with conn:
+            conn.executemany(
+                'INSERT INTO user_data (user_id, data) VALUES (?, ?)',
+                [(user_id, dump(data)) for user_id, data in (legacy.get('user_data') or {}).items()]
+            )
+            conn.executemany(
+                'INSERT INTO chat_data (chat_id, data) VALUES (?, ?)',
+                [(chat_id, dump(data)) for chat_id, data in (legacy.get('chat_data') or {}).items()]
+            )
+            for key in ('bot_data', 'callback_data'):
+                if legacy.get(key) is not None:
+                    conn.execute('INSERT INTO kv_data (key, data) VALUES (?, ?)', (key, dump(legacy[key])))
+            conn.executemany(
+                'INSERT INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                [
+                    (name, dump(key), dump(state))
+                    for name, states in (legacy.get('conversations') or {}).items()
+                    for key, state in states.items()
+                ]
+            )
+        logger.info(
+            "Импортированы данные PicklePersistence из %s: пользователей %s, чатов %s",
+            self.legacy_path, len(legacy.get('user_data') or {}), len(legacy.get('chat_data') or {})
+        )
+
+    def _load_row(self, table: str, column: str, row_id: Any) -> Optional[Any]:
+        row = self._connection().execute(
+            f'SELECT data FROM {table} WHERE {column} = ?', (row_id,)
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _write_row(self, table: str, column: str, row_id: Any, data: Any):
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = _digest(blob)
+        if self._written.get((table, row_id)) == digest:
+            self._written.move_to_end((table, row_id))
+            return
+        with self._connection() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {table} ({column}, data) VALUES (?, ?)', (row_id, blob))
+        self._written.touch((table, row_id), digest)
+
+    def _delete_row(self, table: str, column: str, row_id: Any):
+        with self._connection() as conn:
+            conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (row_id,))
+        self._written.pop((table, row_id), None)
+
+    def _load_conversations(self, name: str) -> Dict:
+        rows = self._connection().execute(
+            'SELECT key, state FROM conversations WHERE name = ?', (name,)
+        ).fetchall()
+        return {pickle.loads(key): pickle.loads(state) for key, state in rows}
+
+    def _write_conversation(self, name: str, key: Tuple, state: Optional[object]):
+        key_blob = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connection() as conn:
+            if state is None:
+                conn.execute('DELETE FROM conversations WHERE name = ? AND key = ?', (name, key_blob))
+            else:
+                conn.execute(
+                    'INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                    (name, key_blob, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+                )
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        """Выполнение операции с SQLite в потоке персистентности"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    # --- Интерфейс BasePersistence ---
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        # Данные пользователей подгружаются в refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        # Данные чатов подгружаются в refresh_chat_data
+        return {}
+
+    async def get_bot_data(self) -> Any:
+        data = await self._run(self._load_row, 'kv_data', 'key', 'bot_data')
+        return data if data is not None else {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return await self._run(self._load_row, 'kv_data', 'key', 'callback_data')
+
+    async def get_conversations(self, name: str) -> Dict:
+        return await self._run(self._load_conversations, name)
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        await self._run(self._write_conversation, name, key, new_state)
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        self._loaded_users.touch(user_id)
+        await self._run(self._write_row, 'user_data', 'user_id', user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        self._loaded_chats.touch(chat_id)
+        await self._run(self._write_row, 'chat_data', 'chat_id', chat_id, data)
+
+    async def update_bot_data(self, data: Any) -> None:
+        await self._run(self._write_row, 'kv_data', 'key', 'bot_data', data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        await self._run(self._write_row, 'kv_data', 'key', 'callback_data', data)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._loaded_chats.pop(chat_id, None)
+        await self._run(self._delete_row, 'chat_data', 'chat_id', chat_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded_users.pop(user_id, None)
+        await self._run(self._delete_row, 'user_data', 'user_id', user_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        # Ленивая загрузка: данные читаются из БД один раз, пока пользователь
+        # не вытеснен из кэша; значения в памяти новее записанных и не заменяются
+        if user_id in self._loaded_users:
+            self._loaded_users.move_to_end(user_id)
+            return
+        self._loaded_users.touch(user_id)
+        stored = await self._run(self._load_row, 'user_data', 'user_id', user_id)
+        if stored:
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        if chat_id in self._loaded_chats:
+            self._loaded_chats.move_to_end(chat_id)
+            return
+        self._loaded_chats.touch(chat_id)
+        stored = await self._run(self._load_row, 'chat_data', 'chat_id', chat_id)
+        if stored:
+            for key, value in stored.items():
+                chat_data.setdefault(key, value)
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        # bot_data загружается целиком при запуске
+        pass
+
+    async def flush(self) -> None:
+        # Все изменения уже записаны построчно, остается закрыть соединение
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from telegram import Bot, Message
+from telegram.error import RetryAfter
+
+from utils.metrics import SENDER_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram: ~30 сообщений в секунду на бота и ~1 в секунду в один чат
+SENDER_GLOBAL_RATE = float(os.getenv('SENDER_GLOBAL_RATE', '25'))
+SENDER_CHAT_RATE = float(os.getenv('SENDER_CHAT_RATE', '1'))
+SENDER_WORKERS = int(os.getenv('SENDER_WORKERS', '8'))
+SENDER_MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Асинхронный ограничитель скорости «корзина токенов»"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def try_acquire(self) -> float:
+        """Получение токена без ожидания; 0, если он взят, иначе время до следующего"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """Ожидание и получение одного токена"""
+        async with self._lock:
+            while True:
+                delay = self.try_acquire()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+
+
+class OutboundSender:
+    """Очередь исходящих сообщений с ограничением скорости
+
+    Сообщения отправляются несколькими параллельными обработчиками с общим
+    и поканальным ограничением скорости. У каждого чата своя очередь, а в общей
+    очереди лежат чаты, готовые к отправке: чат без свободного токена
+    возвращается в нее к моменту появления токена и не занимает обработчик,
+    поэтому частые сообщения в один чат не задерживают остальные. Сообщения
+    одного чата отправляются по порядку. При ответе RetryAfter (flood control)
+    отправка приостанавливается для всех обработчиков на указанное время,
+    после чего сообщение отправляется повторно.
+    """
+
+    def __init__(self, global_rate: float = SENDER_GLOBAL_RATE, chat_rate: float = SENDER_CHAT_RATE,
+                 workers: int = SENDER_WORKERS):
+        self.bot: Optional[Bot] = None
+        self.workers = workers
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_rate = chat_rate
+        # Корзины неактивных чатов удаляются сами
+        self._chat_buckets = TTLCache(maxsize=100_000, ttl=60)
+        # Неотправленные сообщения по чатам; чат есть в словаре, пока он в общей очереди
+        self._chats: Dict[int, Deque[Tuple[str, dict, asyncio.Future]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._drained = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._paused_until = 0.0
+
+    def start(self, bot: Bot):
+        """Запуск обработчиков очереди (из работающего цикла событий)"""
+        self.bot = bot
+        self._queue = asyncio.Queue()
+        self._drained.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f'sender-{i}')
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Отправка оставшихся сообщений и остановка обработчиков"""
+        if self._queue is None:
+            return
+        await self._drained.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Message:
+        """Постановка сообщения в очередь и ожидание результата отправки"""
+        if self._queue is None:
+            raise RuntimeError("OutboundSender не запущен")
+        future = asyncio.get_running_loop().create_future()
+        messages = self._chats.get(chat_id)
+        if messages is None:
+            messages = self._chats[chat_id] = deque()
+            self._queue.put_nowait(chat_id)
+        messages.append((text, kwargs, future))
+        self._drained.clear()
+        return await future
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._chat_rate, capacity=1)
+        # Повторная запись продлевает время жизни корзины
+        self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_flood_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict) -> Message:
+        """Отправка с общим ограничением скорости и повторами после RetryAfter"""
+        for attempt in range(SENDER_MAX_RETRIES + 1):
+            await self._wait_flood_pause()
+            await self._global_bucket.acquire()
+            try:
+                message = await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                SENDER_EVENTS.inc('sent')
+                return message
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                SENDER_EVENTS.inc('retry_after')
+                logger.warning("Flood control Telegram: пауза %s с (попытка %s)", retry_after, attempt + 1)
+                if attempt == SENDER_MAX_RETRIES:
+                    raise
+
+    def _reschedule(self, chat_id: int):
+        """Возврат чата в общую очередь или его удаление, если сообщений не осталось"""
+        if self._chats[chat_id]:
+            self._queue.put_nowait(chat_id)
+            return
+        del self._chats[chat_id]
+        if not self._chats:
+            self._drained.set()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id = await self._queue.get()
+            # Токена чата нет - чат вернется в очередь, когда он появится
+            delay = self._chat_bucket(chat_id).try_acquire()
+            if delay:
+                loop.call_later(delay, self._queue.put_nowait, chat_id)
+                continue
+
+            text, kwargs, future = self._chats[chat_id].popleft()
+            try:
+                message = await self._send(chat_id, text, kwargs)
+                if not future.done():
+                    future.set_result(message)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                SENDER_EVENTS.inc('failed')
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._reschedule(chat_id)
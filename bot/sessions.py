@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+
+from database.async_manager import AsyncDatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Хранилище сессий: sqlite (переживает перезапуск, общее для процессов) или memory
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'sqlite')
+# Время жизни незавершенной записи (секунды)
+SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))
+# Период удаления истекших сессий из SQLite (секунды)
+SESSION_PURGE_INTERVAL = int(os.getenv('SESSION_PURGE_INTERVAL', '600'))
+
+
+class BookingSession:
+    """Состояние незавершенной записи пользователя"""
+
+    __slots__ = ('user_id', 'username', 'date', 'time', 'contact_info', 'waiting_for_contact', 'service')
+
+    def __init__(self, user_id: int, username: str, date: str, time: str,
+                 contact_info: Optional[str] = None, waiting_for_contact: bool = True,
+                 service: Optional[str] = None):
+        self.user_id = user_id
+        self.username = username
+        self.date = date
+        self.time = time
+        self.contact_info = contact_info
+        self.waiting_for_contact = waiting_for_contact
+        # Ключ услуги; у сессий, сохраненных до появления услуг, его нет
+        self.service = service
+
+    def to_dict(self) -> Dict:
+        """Преобразование в словарь"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BookingSession':
+        """Создание из словаря"""
+        return cls(**data)
+
+
+class MemorySessionStore:
+    """Сессии в памяти процесса с вытеснением по времени жизни"""
+
+    def __init__(self, ttl: int = SESSION_TTL, maxsize: int = 100_000):
+        self.ttl = ttl
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, user_id: int) -> Optional[BookingSession]:
+        """Сессия пользователя или None"""
+        return self._sessions.get(user_id)
+
+    async def save(self, session: BookingSession):
+        """Сохранение сессии, время жизни отсчитывается заново"""
+        self._sessions[session.user_id] = session
+
+    async def delete(self, user_id: int):
+        """Удаление сессии пользователя"""
+        self._sessions.pop(user_id, None)
+
+    async def purge_expired(self) -> int:
+        """Удаление истекших сессий"""
+        before = len(self._sessions)
+        self._sessions.expire()
+        return before - len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Сессии в таблице booking_sessions базы записей
+
+    Переживают перезапуск бота и доступны всем процессам, работающим
+    с одной базой. Истекшие сессии не читаются и удаляются периодически.
+    """
+
+    def __init__(self, db: AsyncDatabaseManager, ttl: int = SESSION_TTL):
+        self.db = db
+        self.ttl = ttl
+
+    async def get(self, user_id: int) -> Optional[BookingSession]:
+        """Сессия пользователя или None"""
+        data = await self.db.get_session(user_id, time.time())
+        return BookingSession.from_dict(data) if data else None
+
+    async def save(self, session: BookingSession):
+        """Сохранение сессии, время жизни отсчитывается заново"""
+        await self.db.save_session(session.user_id, session.to_dict(), time.time() + self.ttl)
+
+    async def delete(self, user_id: int):
+        """Удаление сессии пользователя"""
+        await self.db.delete_session(user_id)
+
+    async def purge_expired(self) -> int:
+        """Удаление истекших сессий"""
+        return await self.db.purge_expired_sessions(time.time())
+
+
+def create_session_store(db: AsyncDatabaseManager, backend: str = SESSION_BACKEND):
+    """Хранилище сессий по настройке SESSION_BACKEND"""
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore(db)
+    raise ValueError(f"Неизвестное хранилище сессий: {backend}")
+
+
+async def purge_expired_sessions(context):
+    """Задача JobQueue: удаление истекших сессий"""
+    store = context.job.data
+    try:
+        purged = await store.purge_expired()
+        if purged:
+            logger.info("Удалено истекших сессий: %s", purged)
+    except Exception as e:
+        logger.error("Ошибка очистки сессий: %s", e)
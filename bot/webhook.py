@@ -0,0 +1,182 @@
+import os
+import json
+import hmac
+import logging
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from utils.metrics import METRICS_ENABLED, UPDATES_DROPPED, registry
+
+logger = logging.getLogger(__name__)
+
+# Настройки режима webhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Публичный адрес (https://bot.example.com)
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Сколько обновлений может ждать обработки, прежде чем сервер ответит 503
+WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', '1000'))
+# Число параллельных соединений, которые откроет Telegram
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Предельный размер тела запроса; обновления Telegram намного меньше
+WEBHOOK_MAX_BODY = int(os.getenv('WEBHOOK_MAX_BODY', str(1024 * 1024)))
+
+
+class WebhookApp:
+    """ASGI-приложение, принимающее обновления Telegram
+
+    Обновление проверяется по секретному заголовку и ставится в очередь
+    Application. Если необработанных обновлений слишком много, возвращается
+    503, и Telegram повторит доставку позже. Сервер может работать за обратным прокси.
+    """
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH,
+                 secret: str = WEBHOOK_SECRET, max_pending: int = WEBHOOK_MAX_PENDING,
+                 max_body: int = WEBHOOK_MAX_BODY):
+        self.application = application
+        self.path = path
+        self.secret = secret
+        self.max_pending = max_pending
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        if scope['path'] == '/healthz' and scope['method'] == 'GET':
+            await self._respond(send, 200, b'ok')
+            return
+        if scope['path'] == '/metrics' and scope['method'] == 'GET' and METRICS_ENABLED:
+            await self._respond(send, 200, registry.render_prometheus().encode())
+            return
+        if scope['path'] != self.path:
+            await self._respond(send, 404, b'not found')
+            return
+        if scope['method'] != 'POST':
+            await self._respond(send, 405, b'method not allowed')
+            return
+
+        # Слишком большое тело отклоняется до чтения: по заголовку или по мере поступления
+        headers = dict(scope.get('headers', []))
+        content_length = headers.get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > self.max_body:
+            await self._respond(send, 413, b'payload too large')
+            return
+
+        if self.secret:
+            # Сравнение байтов: str с не-ASCII символами compare_digest не принимает
+            token = headers.get(b'x-telegram-bot-api-secret-token', b'')
+            if not hmac.compare_digest(token, self.secret.encode()):
+                await self._respond(send, 403, b'forbidden')
+                return
+
+        if self._pending_updates() >= self.max_pending:
+            logger.warning("Очередь обновлений переполнена, webhook отвечает 503")
+            UPDATES_DROPPED.inc('webhook_queue_full')
+            await self._respond(send, 503, b'busy')
+            return
+
+        body = await self._read_body(receive, self.max_body)
+        if body is None:
+            await self._respond(send, 413, b'payload too large')
+            return
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning("Некорректное обновление webhook: %s", e)
+            await self._respond(send, 400, b'bad request')
+            return
+
+        track = getattr(self.application.update_processor, 'track', None)
+        if track is not None:
+            track(update)
+        await self.application.update_queue.put(update)
+        await self._respond(send, 200, b'ok')
+
+    def _pending_updates(self) -> int:
+        """Сколько принятых обновлений еще не обработано
+
+        При параллельной обработке Application сразу забирает обновления из
+        update_queue, поэтому учитываются и те, что ждут у процессора обновлений.
+        """
+        in_flight = getattr(self.application.update_processor, 'pending_updates', 0)
+        return self.application.update_queue.qsize() + in_flight
+
+    @staticmethod
+    async def _read_body(receive, max_body: int) -> Optional[bytes]:
+        """Чтение тела запроса; None, если оно длиннее max_body"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > max_body:
+                return None
+            if not message.get('more_body'):
+                return bytes(body)
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        # Жизненным циклом Application управляет run_webhook
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def run_webhook(application: Application, webhook_url: Optional[str] = WEBHOOK_URL,
+                      listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+    """Запуск бота в режиме webhook со встроенным ASGI-сервером
+
+    Если webhook_url не задан, webhook в Telegram не регистрируется - это
+    удобно для локального тестового стенда, отправляющего обновления напрямую.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(
+        WebhookApp(application), host=listen, port=port,
+        log_level='warning', proxy_headers=True
+    ))
+
+    try:
+        async with application:
+            # post_init/post_stop/post_shutdown вызывает только run_polling, здесь - вручную
+            # в том же порядке: stop -> post_stop -> shutdown -> post_shutdown
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            try:
+                if webhook_url:
+                    await application.bot.set_webhook(
+                        url=webhook_url.rstrip('/') + WEBHOOK_PATH,
+                        secret_token=WEBHOOK_SECRET or None,
+                        allowed_updates=Update.ALL_TYPES,
+                        max_connections=WEBHOOK_MAX_CONNECTIONS
+                    )
+                logger.info("Webhook-сервер слушает %s:%s%s", listen, port, WEBHOOK_PATH)
+                await server.serve()
+            finally:
+                await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+    finally:
+        # Выход из async with вызывает application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
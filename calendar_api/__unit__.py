@@ -1,3 +1,11 @@
 from .manager import GoogleCalendarManager
+from .async_manager import AsyncGoogleCalendarManager
+from .busy_index import BusyIntervalIndex
+from .slots import WeeklySlotTemplate, DaySlots
+from .sync import CalendarSync
+from .outbox import CalendarOutboxWorker
 
-__all__ = ['GoogleCalendarManager']
\ No newline at end of file
+__all__ = [
+    'GoogleCalendarManager', 'AsyncGoogleCalendarManager', 'BusyIntervalIndex',
+    'CalendarSync', 'CalendarOutboxWorker', 'WeeklySlotTemplate', 'DaySlots'
+]
\ No newline at end of file
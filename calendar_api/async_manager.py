@@ -0,0 +1,77 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import List, Optional, Tuple
+
+from database.models import TimeSlot
+from utils.profiling import trace_section
+from .busy_index import BusyIntervalIndex
+from .manager import GoogleCalendarManager
+
+logger = logging.getLogger(__name__)
+
+# Максимальное число одновременных запросов к Google Calendar
+CALENDAR_MAX_WORKERS = int(os.getenv('CALENDAR_MAX_WORKERS', '8'))
+
+
+class AsyncGoogleCalendarManager:
+    """Асинхронный интерфейс к Google Calendar
+
+    Блокирующие вызовы googleapiclient выполняются в ограниченном пуле потоков,
+    поэтому ожидание ответа Google не останавливает цикл событий бота.
+    """
+
+    def __init__(self, manager: Optional[GoogleCalendarManager] = None,
+                 max_workers: int = CALENDAR_MAX_WORKERS):
+        self.manager = manager or GoogleCalendarManager()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='google-calendar'
+        )
+
+    async def _run(self, func, *args):
+        """Выполнение синхронного метода менеджера в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        with trace_section('google'):
+            return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def get_busy_intervals(self, time_min: datetime, time_max: datetime,
+                                 calendar_ids: Optional[List[str]] = None) -> List[Tuple[datetime, datetime]]:
+        """Получение интервалов занятости через FreeBusy API"""
+        return await self._run(self.manager.get_busy_intervals, time_min, time_max, calendar_ids)
+
+    async def get_available_slots(self, busy_index: Optional[BusyIntervalIndex] = None,
+                                  duration_minutes: Optional[int] = None) -> List[TimeSlot]:
+        """Получение доступных временных слотов"""
+        return await self._run(self.manager.get_available_slots, busy_index, duration_minutes)
+
+    async def is_slot_available(self, slot_datetime: datetime, duration_minutes: Optional[int] = None) -> bool:
+        """Проверка доступности временного слота в календаре"""
+        return await self._run(self.manager.is_slot_available, slot_datetime, duration_minutes)
+
+    async def create_event(self, date: str, time: str, client_info: str, contact_info: str,
+                           event_id: Optional[str] = None, service_name: Optional[str] = None,
+                           duration_minutes: Optional[int] = None, price: Optional[int] = None) -> Optional[str]:
+        """Создание события в календаре"""
+        return await self._run(
+            self.manager.create_event, date, time, client_info, contact_info,
+            event_id, service_name, duration_minutes, price
+        )
+
+    async def delete_event(self, event_id: str) -> bool:
+        """Удаление события из календаря"""
+        return await self._run(self.manager.delete_event, event_id)
+
+    async def warm_up(self):
+        """Фоновое создание клиента Google; ошибка не мешает работе бота"""
+        try:
+            await self._run(self.manager.warm_up)
+        except Exception as e:
+            logger.error("Не удалось подготовить клиент Google Calendar: %s", e)
+
+    async def shutdown(self):
+        """Остановка пула потоков с ожиданием начатых запросов к Google"""
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
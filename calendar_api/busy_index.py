@@ -0,0 +1,99 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def event_interval(event: Dict, tz) -> Optional[Tuple[datetime, datetime]]:
+    """Интервал занятости события Google Calendar
+
+    Учитывает длительность события и события на весь день (поле date).
+    Для "прозрачных" событий (отмечены как свободное время) возвращает None.
+    """
+    if event.get('transparency') == 'transparent':
+        return None
+
+    start, end = event.get('start', {}), event.get('end', {})
+    if 'dateTime' in start:
+        return (datetime.fromisoformat(start['dateTime']),
+                datetime.fromisoformat(end['dateTime']))
+
+    # Событие на весь день: дата окончания не включается
+    start_date = datetime.strptime(start['date'], '%Y-%m-%d')
+    end_date = datetime.strptime(end['date'], '%Y-%m-%d') if 'date' in end \
+        else start_date + timedelta(days=1)
+    return tz.localize(start_date), tz.localize(end_date)
+
+
+class BusyIntervalIndex:
+    """Отсортированный индекс занятых интервалов
+
+    Интервалы хранятся отсортированными по началу вместе с префиксным
+    максимумом окончаний. Проверка пересечения [start, end) с любым
+    занятым интервалом выполняется бинарным поиском за O(log n).
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime]] = ()):
+        self._intervals: List[Tuple[float, float]] = []
+        self._starts: List[float] = []
+        self._max_ends: List[float] = []
+        self._sorted = True
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start: datetime, end: datetime):
+        """Добавление занятого интервала"""
+        if end <= start:
+            return
+        self.add_ts(start.timestamp(), end.timestamp())
+
+    def add_ts(self, start: float, end: float):
+        """Добавление занятого интервала с границами в секундах epoch"""
+        if end <= start:
+            return
+        self._intervals.append((start, end))
+        self._sorted = False
+
+    def _build(self):
+        """Сортировка интервалов и расчет префиксного максимума окончаний"""
+        self._intervals.sort()
+        self._starts = [start for start, _ in self._intervals]
+        self._max_ends = []
+        max_end = float('-inf')
+        for _, end in self._intervals:
+            max_end = max(max_end, end)
+            self._max_ends.append(max_end)
+        self._sorted = True
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """Пересекается ли интервал [start, end) с занятым временем"""
+        return self.overlaps_ts(start.timestamp(), end.timestamp())
+
+    def overlaps_ts(self, start: float, end: float) -> bool:
+        """То же, что overlaps, для границ в секундах epoch"""
+        if not self._sorted:
+            self._build()
+
+        # Последний интервал, начинающийся раньше окончания проверяемого
+        idx = bisect_left(self._starts, end) - 1
+        if idx < 0:
+            return False
+        return self._max_ends[idx] > start
+
+    def between(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Занятые интервалы, пересекающиеся с [start, end) (секунды epoch)"""
+        if not self._sorted:
+            self._build()
+
+        result = []
+        idx = bisect_left(self._starts, end) - 1
+        # Префиксный максимум окончаний позволяет остановиться, как только
+        # все более ранние интервалы заканчиваются до start
+        while idx >= 0 and self._max_ends[idx] > start:
+            interval = self._intervals[idx]
+            if interval[1] > start:
+                result.append(interval)
+            idx -= 1
+        return result
+
+    def __len__(self) -> int:
+        return len(self._intervals)
@@ -1,12 +1,12 @@
 import os
+import json
 import pickle
 import logging
+import threading
 from datetime import datetime, timedelta
 from pytz import timezone
-from typing import List, Optional
-from googleapiclient.discovery import build
+from typing import Dict, Iterator, List, Optional, Tuple
 from googleapiclient.errors import HttpError
-from google.oauth2 import service_account
 
 
 from config import (
@@ -15,15 +15,46 @@ from config import (
     WORKING_HOURS_END, DAYS_AHEAD_BOOKING, SERVICE_PRICE_RUB, ADMIN_CONTACT, PHONE_NUMBER
 )
 from database.models import TimeSlot
+from utils.metrics import CALENDAR_SECONDS
+from .busy_index import BusyIntervalIndex
+from .slots import WeeklySlotTemplate
 
 logger = logging.getLogger(__name__)
 
+# Максимальный размер страницы events.list, допустимый API
+EVENTS_PAGE_SIZE = 2500
+
 class GoogleCalendarManager:
     """Менеджер для работы с Google Calendar API"""
 
     def __init__(self):
-        self.service = None
-        self.authenticate()
+        # Клиент создается при первом обращении (или прогревом в фоне), чтобы
+        # запуск бота не ждал импорта googleapiclient и чтения ключей
+        self._credentials = None
+        self._discovery_doc = None
+        self._init_lock = threading.Lock()
+        # googleapiclient (httplib2) не потокобезопасен, поэтому каждый поток
+        # пула получает собственный экземпляр сервиса
+        self._local = threading.local()
+        # Шаблон слотов по рабочему времени, кандидаты не пересчитываются на каждый запрос
+        self.slot_template = WeeklySlotTemplate(
+            WORKING_DAYS, WORKING_HOURS_START, WORKING_HOURS_END, timezone('Europe/Minsk')
+        )
+
+    @property
+    def service(self):
+        """Клиент Calendar API для текущего потока"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            if self._credentials is None:
+                with self._init_lock:
+                    if self._credentials is None:
+                        self.authenticate()
+            from googleapiclient.discovery import build_from_document
+            # Разобранный документ общий для всех потоков, сеть не нужна
+            service = build_from_document(self._discovery_doc, credentials=self._credentials)
+            self._local.service = service
+        return service
 
     def authenticate(self):
         """Аутентификация через Service Account"""
@@ -34,131 +65,135 @@ class GoogleCalendarManager:
                     "Скачайте JSON с ключами сервисного аккаунта из Google Cloud Console."
                 )
 
-            creds = service_account.Credentials.from_service_account_file(
+            from google.oauth2 import service_account
+            from googleapiclient.discovery_cache import get_static_doc
+
+            # Документ discovery поставляется вместе с библиотекой
+            discovery_doc = get_static_doc('calendar', 'v3')
+            if discovery_doc is None:
+                raise RuntimeError("В googleapiclient нет встроенного документа discovery для calendar v3")
+            self._discovery_doc = json.loads(discovery_doc)
+
+            self._credentials = service_account.Credentials.from_service_account_file(
                 GOOGLE_SERVICE_ACCOUNT_FILE,
                 scopes=GOOGLE_SCOPES
             )
-            self.service = build('calendar', 'v3', credentials=creds)
             logger.info("Google Calendar API инициализован через Service Account")
 
         except Exception as e:
-            logger.error(f"Ошибка аутентификации Google: {e}")
+            logger.error("Ошибка аутентификации Google: %s", e)
             raise
 
-    def get_available_slots(self) -> List[TimeSlot]:
-        """Получение доступных временных слотов с диагностикой"""
+    def warm_up(self):
+        """Создание клиента заранее, чтобы первый запрос пользователя не ждал"""
+        self.service
+
+    @CALENDAR_SECONDS.timed('freebusy.query')
+    def get_busy_intervals(self, time_min: datetime, time_max: datetime,
+                           calendar_ids: Optional[List[str]] = None) -> List[Tuple[datetime, datetime]]:
+        """Получение интервалов занятости через FreeBusy API
+
+        Возвращает только интервалы без описаний и участников событий,
+        что уменьшает объем ответа и расход квоты.
+        """
+        calendar_ids = calendar_ids or [CALENDAR_ID]
+        response = self.service.freebusy().query(
+            body={
+                'timeMin': time_min.isoformat(),
+                'timeMax': time_max.isoformat(),
+                'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+            },
+            fields='calendars(busy,errors)'
+        ).execute()
+
+        busy_intervals = []
+        for calendar_id, calendar in response.get('calendars', {}).items():
+            if calendar.get('errors'):
+                # Без данных о занятости нельзя безопасно предлагать слоты
+                raise RuntimeError(f"Ошибка FreeBusy для календаря {calendar_id}: {calendar['errors']}")
+            for busy in calendar.get('busy', []):
+                busy_intervals.append((
+                    datetime.fromisoformat(busy['start'].replace('Z', '+00:00')),
+                    datetime.fromisoformat(busy['end'].replace('Z', '+00:00'))
+                ))
+        return busy_intervals
+
+    def iter_event_pages(self, sync_token: Optional[str] = None,
+                         time_min: Optional[datetime] = None,
+                         calendar_id: str = CALENDAR_ID) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+        """Постраничная выгрузка событий для синхронизации
+
+        Без sync_token выполняется полная выгрузка начиная с time_min,
+        с токеном - только изменения с прошлой синхронизации (включая удаления).
+        Страницы отдаются по мере загрузки, поэтому память не растет с размером
+        календаря. Вместе с последней страницей возвращается токен следующей
+        синхронизации, для остальных страниц - None.
+        """
+        params = {
+            'calendarId': calendar_id,
+            'singleEvents': True,
+            'maxResults': EVENTS_PAGE_SIZE,
+            'fields': 'items(id,status,start,end,transparency),nextPageToken,nextSyncToken',
+        }
+        if sync_token:
+            params['syncToken'] = sync_token
+        elif time_min:
+            params['timeMin'] = time_min.isoformat()
+
+        page_token = None
+        while True:
+            with CALENDAR_SECONDS.time('events.list'):
+                response = self.service.events().list(pageToken=page_token, **params).execute()
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                yield response.get('items', []), response.get('nextSyncToken')
+                return
+            yield response.get('items', []), None
+
+    def get_available_slots(self, busy_index: Optional[BusyIntervalIndex] = None,
+                            duration_minutes: Optional[int] = None) -> List[TimeSlot]:
+        """Получение доступных временных слотов с диагностикой
+
+        Если передан busy_index (например, из локальной копии календаря),
+        запрос к Google не выполняется. duration_minutes - длительность
+        услуги, по умолчанию SERVICE_DURATION_HOURS.
+        """
         available_slots = []
         tz = timezone('Europe/Minsk')  # Указываем ваш часовой пояс
 
         try:
             current_time = datetime.now(tz)
-            logger.info(f"Текущее время: {current_time}")
-            logger.info(f"Рабочие дни: {WORKING_DAYS}")
-            logger.info(f"Рабочие часы: {WORKING_HOURS_START}-{WORKING_HOURS_END}")
-            logger.info(f"Дней вперед: {DAYS_AHEAD_BOOKING}")
+            logger.debug("Текущее время: %s", current_time)
+            logger.debug("Рабочие дни: %s", WORKING_DAYS)
+            logger.debug("Рабочие часы: %s-%s", WORKING_HOURS_START, WORKING_HOURS_END)
+            logger.debug("Дней вперед: %s", DAYS_AHEAD_BOOKING)
 
             # --- Оптимизация: Получаем все занятые события за один запрос ---
             start_period = current_time
             end_period = current_time + timedelta(days=DAYS_AHEAD_BOOKING + 1)
 
-            events_result = self.service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=start_period.isoformat(),
-                timeMax=end_period.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            busy_events = events_result.get('items', [])
-
-            # Создаем множество с началом занятых слотов для быстрой проверки
-            busy_slots_start_times = set()
-            for event in busy_events:
-                # Google API всегда возвращает время с часовым поясом
-                start_str = event['start'].get('dateTime', event['start'].get('date'))
-                start_dt = datetime.fromisoformat(start_str)
-                busy_slots_start_times.add(start_dt)
-
-            for day in range(1, DAYS_AHEAD_BOOKING + 1):
-                date_to_check = current_time.date() + timedelta(days=day)
-
-                if date_to_check.weekday() not in WORKING_DAYS:
-                    continue
-
-                for hour in range(WORKING_HOURS_START, WORKING_HOURS_END):
-                    # Сразу создаем "осознающий" объект datetime
-                    slot_datetime = tz.localize(datetime(
-                        date_to_check.year, date_to_check.month, date_to_check.day, hour
-                    ))
-
-                    if slot_datetime <= current_time:
-                        continue
-
-                    # Проверяем, не занят ли слот, локально (быстро)
-                    if slot_datetime not in busy_slots_start_times:
-                        slot = TimeSlot(
-                            date=slot_datetime.strftime('%Y-%m-%d'),
-                            time=slot_datetime.strftime('%H:%M'),
-                            datetime=slot_datetime,
-                            is_available=True
-                        )
-                        available_slots.append(slot)
-
-            logger.info(f"Найдено доступных слотов: {len(available_slots)}")
-            return available_slots
-
-            '''slots_generated = 0
-            slots_available = 0
-
-            for day in range(1, DAYS_AHEAD_BOOKING + 1):
-                date = current_time + timedelta(days=day)
-
-                # Пропускаем нерабочие дни
-                if date.weekday() not in WORKING_DAYS:
-                    logger.debug(f"Пропуск нерабочего дня: {date.strftime('%Y-%m-%d (%A)')}")
-                    continue
-
-                # Генерируем слоты для рабочих часов
-                for hour in range(WORKING_HOURS_START, WORKING_HOURS_END):
-                    slot_datetime = date.replace(
-                        hour=hour, minute=0, second=0, microsecond=0
-                    )
+            if busy_index is None:
+                # Запрашиваем только интервалы занятости, без тел событий
+                busy_intervals = self.get_busy_intervals(start_period, end_period)
 
-                    slots_generated += 1
+                # Строим индекс занятых интервалов с учетом длительности событий
+                busy_index = BusyIntervalIndex(busy_intervals)
 
-                    # Пропускаем прошедшие слоты
-                    if slot_datetime <= current_time:
-                        logger.debug(f"Пропуск прошедшего слота: {slot_datetime}")
-                        continue
-
-                    # Проверяем доступность в календаре
-                    logger.debug(f"Проверяем слот: {slot_datetime}")
-
-                    if self.is_slot_available(slot_datetime):
-                        slot = TimeSlot(
-                            date=slot_datetime.strftime('%Y-%m-%d'),
-                            time=slot_datetime.strftime('%H:%M'),
-                            datetime=slot_datetime,
-                            is_available=True
-                        )
-                        available_slots.append(slot)
-                        slots_available += 1
-                        logger.debug(f"Доступный слот: {slot_datetime}")
-                    else:
-                        logger.debug(f"Занятый слот: {slot_datetime}")
-
-            logger.info(f"Сгенерировано слотов: {slots_generated}")
-            logger.info(f"Доступных слотов: {slots_available}")
-            logger.info(f"Возвращаем первые {min(50, len(available_slots))} слотов")'''
+            duration = timedelta(minutes=duration_minutes) if duration_minutes \
+                else timedelta(hours=SERVICE_DURATION_HOURS)
+            # Свободное время каждого дня - битовая маска, места для услуги ищутся побитово
+            available_slots = self.slot_template.available(
+                current_time.date(), DAYS_AHEAD_BOOKING, busy_index, duration, current_time.timestamp()
+            )
 
-            return available_slots[:50]  # Ограничиваем количество
+            logger.info("Найдено доступных слотов: %s", len(available_slots))
+            return available_slots
 
         except Exception as e:
-            logger.error(f"Ошибка получения доступных слотов: {e}")
-            import traceback
-            logger.error(f"Полная трассировка: {traceback.format_exc()}")
+            logger.exception("Ошибка получения доступных слотов: %s", e)
             return []
 
-    def is_slot_available(self, slot_datetime: datetime) -> bool:
+    def is_slot_available(self, slot_datetime: datetime, duration_minutes: Optional[int] = None) -> bool:
         """Проверка доступности временного слота в календаре"""
         try:
             tz = timezone('Europe/Moscow')
@@ -167,51 +202,55 @@ class GoogleCalendarManager:
                 slot_datetime = tz.localize(slot_datetime)
             #slot_datetime = slot_datetime.astimezone(tz)  # Конвертируем в нужную TZ
 
-            time_min = slot_datetime.isoformat()  # Убрали 'Z' - используем локальное время
-            time_max = (slot_datetime + timedelta(hours=SERVICE_DURATION_HOURS)).isoformat()
+            time_min = slot_datetime
+            time_max = slot_datetime + (timedelta(minutes=duration_minutes) if duration_minutes
+                                        else timedelta(hours=SERVICE_DURATION_HOURS))
             #time_min = slot_datetime.isoformat() + 'Z'
             #time_max = (slot_datetime + timedelta(hours=SERVICE_DURATION_HOURS)).isoformat() + 'Z'
 
-            events_result = self.service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=time_min,
-                timeMax=time_max,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
+            busy_intervals = self.get_busy_intervals(time_min, time_max)
 
-            # Добавим логирование событий
-            if events:
-                logger.info(f"Найдены события, делающие слот {slot_datetime} занятым:")
-                for event in events:
-                    logger.info(f"- {event.get('summary')} ({event['start'].get('dateTime')} - {event['end'].get('dateTime')})")
-            return len(events) == 0
+            # Добавим логирование занятых интервалов
+            if busy_intervals:
+                logger.info("Найдены интервалы, делающие слот %s занятым:", slot_datetime)
+                for start, end in busy_intervals:
+                    logger.info("- %s - %s", start.isoformat(), end.isoformat())
+            return len(busy_intervals) == 0
 
         except HttpError as e:
-            logger.error(f"Ошибка проверки доступности слота: {e}")
+            logger.error("Ошибка проверки доступности слота: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при проверке слота: {e}")
+            logger.error("Неожиданная ошибка при проверке слота: %s", e)
             return False
 
-    def create_event(self, date: str, time: str, client_info: str, contact_info: str) -> Optional[str]:
-        """Создание события в календаре"""
+    @CALENDAR_SECONDS.timed('events.insert')
+    def create_event(self, date: str, time: str, client_info: str, contact_info: str,
+                     event_id: Optional[str] = None, service_name: Optional[str] = None,
+                     duration_minutes: Optional[int] = None, price: Optional[int] = None) -> Optional[str]:
+        """Создание события в календаре
+
+        Заданный event_id делает операцию идемпотентной: повторная попытка
+        после сбоя не создаст дубликат события. Услуга, длительность и цена
+        по умолчанию берутся из настроек SERVICE_*.
+        """
         try:
+            service_name = service_name or SERVICE_NAME
+            price = SERVICE_PRICE_RUB if price is None else price
             start_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-            end_datetime = start_datetime + timedelta(hours=SERVICE_DURATION_HOURS)
+            end_datetime = start_datetime + (timedelta(minutes=duration_minutes) if duration_minutes
+                                             else timedelta(hours=SERVICE_DURATION_HOURS))
 
             description = (
-                f"Консультация с клиентом: {client_info}\n"
+                f"{service_name} с клиентом: {client_info}\n"
                 f"Контакт: {contact_info}\n"
-                f"Стоимость: {SERVICE_PRICE_RUB} руб.\n"
+                f"Стоимость: {price} руб.\n"
                 f"Администратор: {ADMIN_CONTACT}\n"
                 f"Телефон: {PHONE_NUMBER}"
             )
 
             event = {
-                'summary': f'{SERVICE_NAME} - {client_info}',
+                'summary': f'{service_name} - {client_info}',
                 'description': description,
                 'start': {
                     'dateTime': start_datetime.isoformat(),
@@ -229,22 +268,29 @@ class GoogleCalendarManager:
                     ],
                 },
             }
+            if event_id:
+                event['id'] = event_id
 
             created_event = self.service.events().insert(
                 calendarId=CALENDAR_ID, body=event
             ).execute()
 
             event_id = created_event['id']
-            logger.info(f"Создано событие в календаре: {event_id}")
+            logger.info("Создано событие в календаре: %s", event_id)
             return event_id
 
         except HttpError as e:
-            logger.error(f"Ошибка создания события в календаре: {e}")
+            if event_id and e.resp.status == 409:
+                # Событие уже создано предыдущей попыткой
+                logger.info("Событие %s уже существует в календаре", event_id)
+                return event_id
+            logger.error("Ошибка создания события в календаре: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при создании события: {e}")
+            logger.error("Неожиданная ошибка при создании события: %s", e)
             return None
 
+    @CALENDAR_SECONDS.timed('events.delete')
     def delete_event(self, event_id: str) -> bool:
         """Удаление события из календаря"""
         try:
@@ -252,15 +298,17 @@ class GoogleCalendarManager:
                 calendarId=CALENDAR_ID, eventId=event_id
             ).execute()
 
-            logger.info(f"Удалено событие из календаря: {event_id}")
+            logger.info("Удалено событие из календаря: %s", event_id)
             return True
 
         except HttpError as e:
-            if e.resp.status == 404:
-                logger.warning(f"Событие {event_id} не найдено")
+            if e.resp.status in (404, 410):
+                # Событие уже удалено - цель операции достигнута
+                logger.warning("Событие %s не найдено", event_id)
+                return True
             else:
-                logger.error(f"Ошибка удаления события: {e}")
+                logger.error("Ошибка удаления события: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при удалении события: {e}")
+            logger.error("Неожиданная ошибка при удалении события: %s", e)
             return False
@@ -0,0 +1,116 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict
+
+from database.manager import DatabaseManager
+from .manager import GoogleCalendarManager
+
+logger = logging.getLogger(__name__)
+
+# Период опроса очереди операций с календарем (секунды)
+CALENDAR_OUTBOX_INTERVAL = int(os.getenv('CALENDAR_OUTBOX_INTERVAL', '10'))
+# После стольких неудач задача повторяется раз в сутки
+CALENDAR_OUTBOX_MAX_ATTEMPTS = 8
+
+
+class CalendarOutboxWorker:
+    """Фоновый обработчик очереди операций с Google Calendar
+
+    Запись подтверждается локальной транзакцией, а создание и удаление
+    событий в календаре выполняется здесь с повторами и экспоненциальной
+    задержкой при ошибках.
+    """
+
+    def __init__(self, calendar: GoogleCalendarManager, db: DatabaseManager,
+                 interval: int = CALENDAR_OUTBOX_INTERVAL):
+        self.calendar = calendar
+        self.db = db
+        self.interval = interval
+        self._drain_lock = threading.Lock()
+        # Выполняющиеся run(): и плановые из JobQueue, и запущенные через wake()
+        self._running = set()
+
+    def _process(self, task: Dict) -> bool:
+        """Выполнение одной задачи очереди"""
+        payload = task['payload']
+        if task['action'] == 'create':
+            event_id = self.calendar.create_event(
+                payload['date'], payload['time'], payload['client_info'],
+                payload['contact_info'], event_id=payload.get('event_id'),
+                service_name=payload.get('service_name'), duration_minutes=payload.get('duration_minutes'),
+                price=payload.get('price')
+            )
+            if not event_id:
+                return False
+            self.db.complete_outbox_create(task['id'], task['booking_id'], event_id)
+            return True
+
+        if task['action'] == 'delete':
+            if not self.calendar.delete_event(payload['event_id']):
+                return False
+            self.db.complete_outbox(task['id'])
+            return True
+
+        logger.error("Неизвестное действие в очереди календаря: %s", task['action'])
+        self.db.complete_outbox(task['id'])
+        return True
+
+    def drain(self, batch_size: int = 20):
+        """Обработка всех задач, срок выполнения которых наступил"""
+        # Одновременно очередь разбирает только один поток
+        if not self._drain_lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                tasks = self.db.get_due_outbox(batch_size)
+                if not tasks:
+                    return
+
+                for task in tasks:
+                    try:
+                        done = self._process(task)
+                        error = None if done else 'Календарь вернул ошибку'
+                    except Exception as e:
+                        done, error = False, str(e)
+
+                    if not done:
+                        attempts = task['attempts'] + 1
+                        delay = 24 * 3600 if attempts >= CALENDAR_OUTBOX_MAX_ATTEMPTS \
+                            else min(2 ** attempts * 5, 3600)
+                        self.db.retry_outbox(task['id'], error, time.time() + delay)
+                        logger.warning(
+                            "Задача календаря %s (%s) не выполнена, попытка %s, повтор через %s с: %s",
+                            task['id'], task['action'], attempts, delay, error
+                        )
+        finally:
+            self._drain_lock.release()
+
+    async def run(self, context=None):
+        """Задача JobQueue для обработки очереди"""
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            await asyncio.to_thread(self.drain)
+        except Exception as e:
+            logger.error("Ошибка обработки очереди календаря: %s", e)
+        finally:
+            self._running.discard(task)
+
+    async def join(self):
+        """Ожидание выполняющихся обработок очереди
+
+        JobQueue.stop() не дожидается запущенных корутин, а поток drain()
+        продолжает писать в БД, поэтому перед ее закрытием нужно ждать здесь.
+        """
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def wake(self):
+        """Немедленный запуск обработки очереди, не дожидаясь планового"""
+        task = asyncio.get_running_loop().create_task(self.run())
+        # Задача учитывается сразу, еще до первого шага, и не собирается сборщиком мусора
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
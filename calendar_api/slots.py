@@ -0,0 +1,173 @@
+import os
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.models import TimeSlot
+from .busy_index import BusyIntervalIndex
+
+# Шаг сетки слотов (минуты): 60 - слоты по целым часам, 15 или 30 - более частые
+SLOT_GRANULARITY_MINUTES = int(os.getenv('SLOT_GRANULARITY_MINUTES', '60'))
+if SLOT_GRANULARITY_MINUTES <= 0 or 60 % SLOT_GRANULARITY_MINUTES:
+    raise ValueError(
+        f"SLOT_GRANULARITY_MINUTES={SLOT_GRANULARITY_MINUTES}: шаг сетки должен быть "
+        "положительным делителем 60 (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60)"
+    )
+
+
+class DaySlots:
+    """Сетка слотов одной даты
+
+    Рабочее время дня разбито на кванты по шагу сетки. Свободное время
+    представлено битовой маской (бит i - квант i свободен), поэтому поиск
+    мест для услуги любой длительности сводится к нескольким побитовым
+    операциям над целым числом, а не к проверке каждого слота.
+    """
+
+    __slots__ = ('day', 'slots', 'starts', 'start_ts', 'end_ts', 'quantum', 'uniform', 'full')
+
+    def __init__(self, day: date, slots: Tuple[TimeSlot, ...], starts: Tuple[float, ...],
+                 quantum: float, uniform: bool):
+        self.day = day
+        self.slots = slots
+        self.starts = starts
+        self.quantum = quantum
+        # Без перехода на летнее/зимнее время кванты идут ровно через quantum секунд
+        self.uniform = uniform
+        self.start_ts = starts[0] if starts else 0.0
+        self.end_ts = self.start_ts + quantum * len(starts)
+        self.full = (1 << len(starts)) - 1
+
+    def free_mask(self, busy_index: BusyIntervalIndex) -> int:
+        """Маска свободных квантов дня"""
+        mask = self.full
+        if not mask:
+            return mask
+        if not self.uniform:
+            for i, start in enumerate(self.starts):
+                if busy_index.overlaps_ts(start, start + self.quantum):
+                    mask &= ~(1 << i)
+            return mask
+
+        count = len(self.starts)
+        for start, end in busy_index.between(self.start_ts, self.end_ts):
+            first = max(int((start - self.start_ts) // self.quantum), 0)
+            last = min(math.ceil((end - self.start_ts) / self.quantum), count)
+            mask &= ~(((1 << (last - first)) - 1) << first)
+        return mask
+
+
+def fit_mask(free: int, quanta: int) -> int:
+    """Кванты, с которых начинается quanta подряд свободных квантов
+
+    Сдвиги удваиваются, поэтому число операций растет как log(quanta).
+    """
+    fit, span = free, 1
+    while span < quanta and fit:
+        step = min(span, quanta - span)
+        fit &= fit >> step
+        span += step
+    return fit
+
+
+class WeeklySlotTemplate:
+    """Недельный шаблон слотов
+
+    Рабочие дни, часы и шаг сетки один раз компилируются в шаблон недели:
+    для каждого дня недели - начала квантов в минутах от полуночи вместе
+    с готовыми строками 'HH:MM'. Сетка конкретной даты (локализованное время,
+    строка даты, TimeSlot) строится один раз и кэшируется, а список дат
+    горизонта бронирования кэшируется целиком до смены дня.
+
+    TimeSlot из шаблона общие для всех запросов, изменять их нельзя.
+    """
+
+    def __init__(self, working_days: Iterable[int], hours_start: int, hours_end: int, tz,
+                 granularity_minutes: int = SLOT_GRANULARITY_MINUTES):
+        self.tz = tz
+        self.granularity = timedelta(minutes=granularity_minutes)
+        starts = tuple(
+            (minute, f"{minute // 60:02d}:{minute % 60:02d}")
+            for minute in range(hours_start * 60, hours_end * 60, granularity_minutes)
+        )
+        working_days = set(working_days)
+        self._week: Tuple[Tuple[Tuple[int, str], ...], ...] = tuple(
+            starts if weekday in working_days else () for weekday in range(7)
+        )
+        self._days: Dict[date, DaySlots] = {}
+        self._horizon: Optional[Tuple[Tuple[date, int], Tuple[DaySlots, ...]]] = None
+        # Шаблон используется из потоков пула менеджера календаря
+        self._lock = threading.Lock()
+
+    def quanta(self, duration: timedelta) -> int:
+        """Число квантов сетки, занимаемых услугой (с округлением вверх)"""
+        return max(math.ceil(duration / self.granularity), 1)
+
+    def day(self, day: date) -> DaySlots:
+        """Сетка слотов одной даты (без учета занятости)"""
+        with self._lock:
+            return self._day(day)
+
+    def _day(self, day: date) -> DaySlots:
+        day_slots = self._days.get(day)
+        if day_slots is None:
+            date_key = day.isoformat()
+            slots, starts = [], []
+            # Если в этот день нет перехода на летнее/зимнее время, смещение
+            # одно на весь день и localize нужен только для границ дня
+            first = self.tz.localize(datetime(day.year, day.month, day.day))
+            last = self.tz.localize(datetime(day.year, day.month, day.day, 23, 59))
+            tzinfo = first.tzinfo if first.utcoffset() == last.utcoffset() else None
+            for minute, time_key in self._week[day.weekday()]:
+                slot_datetime = datetime(day.year, day.month, day.day, minute // 60, minute % 60)
+                if tzinfo is not None:
+                    slot_datetime = slot_datetime.replace(tzinfo=tzinfo)
+                else:
+                    slot_datetime = self.tz.localize(slot_datetime)
+                starts.append(slot_datetime.timestamp())
+                slots.append(TimeSlot(date=date_key, time=time_key, datetime=slot_datetime, is_available=True))
+            day_slots = self._days[day] = DaySlots(
+                day, tuple(slots), tuple(starts), self.granularity.total_seconds(), tzinfo is not None
+            )
+        return day_slots
+
+    def days(self, today: date, days_ahead: int) -> Tuple[DaySlots, ...]:
+        """Рабочие даты с завтрашнего дня на days_ahead дней вперед"""
+        key = (today, days_ahead)
+        horizon = self._horizon
+        if horizon is not None and horizon[0] == key:
+            return horizon[1]
+
+        with self._lock:
+            # Прошедшие даты больше не понадобятся
+            for day in [day for day in self._days if day <= today]:
+                del self._days[day]
+
+            result = tuple(
+                day_slots for day_slots in (
+                    self._day(today + timedelta(days=offset)) for offset in range(1, days_ahead + 1)
+                )
+                if day_slots.slots
+            )
+            self._horizon = (key, result)
+        return result
+
+    def available(self, today: date, days_ahead: int, busy_index: BusyIntervalIndex,
+                  duration: timedelta, not_before: float) -> List[TimeSlot]:
+        """Слоты, в которые услуга длительностью duration помещается целиком
+
+        Услуга должна закончиться до конца рабочего дня и не пересекаться
+        с занятым временем; начало - позже not_before (секунды epoch).
+        """
+        quanta = self.quanta(duration)
+        available_slots = []
+        for day_slots in self.days(today, days_ahead):
+            mask = fit_mask(day_slots.free_mask(busy_index), quanta)
+            while mask:
+                low = mask & -mask
+                index = low.bit_length() - 1
+                mask ^= low
+                if day_slots.starts[index] > not_before:
+                    available_slots.append(day_slots.slots[index])
+        return available_slots
@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from googleapiclient.errors import HttpError
+from pytz import timezone
+
+from config import CALENDAR_ID
+from database.manager import DatabaseManager
+from .busy_index import event_interval
+from .manager import GoogleCalendarManager
+
+logger = logging.getLogger(__name__)
+
+# Период фоновой синхронизации календаря (секунды)
+CALENDAR_SYNC_INTERVAL = int(os.getenv('CALENDAR_SYNC_INTERVAL', '60'))
+
+
+class CalendarSync:
+    """Фоновая синхронизация занятости Google Calendar в SQLite
+
+    Первая синхронизация выгружает все события, последующие - только
+    изменения по syncToken. При ответе 410 Gone токен считается устаревшим
+    и выполняется полная повторная синхронизация. Пока локальная копия
+    свежая, поиск слотов не обращается к Google.
+    """
+
+    def __init__(self, calendar: GoogleCalendarManager, db: DatabaseManager,
+                 calendar_id: str = CALENDAR_ID, interval: int = CALENDAR_SYNC_INTERVAL):
+        self.calendar = calendar
+        self.db = db
+        self.calendar_id = calendar_id
+        self.interval = interval
+        self.tz = timezone('Europe/Minsk')
+        self._running = set()
+        _, self._synced_at = self.db.get_sync_state(calendar_id)
+
+    def is_fresh(self) -> bool:
+        """Достаточно ли свежа локальная копия для поиска слотов"""
+        return self._synced_at is not None and time.time() - self._synced_at < self.interval * 3
+
+    def sync(self):
+        """Синхронизация: инкрементальная, либо полная при отсутствии токена"""
+        sync_token, _ = self.db.get_sync_state(self.calendar_id)
+        if sync_token:
+            try:
+                self._sync(sync_token)
+                return
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                logger.warning("Токен синхронизации календаря устарел, выполняется полная синхронизация")
+        self._sync(None)
+
+    def _sync(self, sync_token: Optional[str]):
+        """Постраничная загрузка изменений в локальную копию"""
+        full_resync = sync_token is None
+        history_start = datetime.now(self.tz) - timedelta(days=1)
+        if full_resync:
+            # До окончания полной выгрузки локальная копия неполная
+            self._synced_at = None
+
+        pages = self.calendar.iter_event_pages(
+            sync_token=sync_token,
+            time_min=history_start if full_resync else None,
+            calendar_id=self.calendar_id
+        )
+
+        updated = deleted = 0
+        for page_number, (events, next_sync_token) in enumerate(pages):
+            upserts, deleted_ids = [], []
+            for event in events:
+                interval = None
+                if event.get('status') != 'cancelled':
+                    interval = event_interval(event, self.tz)
+                if interval is None:
+                    # Удаленные и "прозрачные" события не занимают время
+                    deleted_ids.append(event['id'])
+                else:
+                    upserts.append((event['id'], interval[0].timestamp(), interval[1].timestamp()))
+
+            # Каждая страница сохраняется сразу; токен приходит только с последней
+            self.db.apply_busy_changes(
+                self.calendar_id, upserts, deleted_ids, next_sync_token,
+                full_resync=full_resync and page_number == 0,
+                prune_before=history_start.timestamp() if next_sync_token else None
+            )
+            updated += len(upserts)
+            deleted += len(deleted_ids)
+
+        self._synced_at = time.time()
+        logger.info(
+            "Синхронизация календаря (%s): %s обновлено, %s удалено",
+            'полная' if full_resync else 'инкрементальная', updated, deleted
+        )
+
+    async def run(self, context=None):
+        """Задача JobQueue для периодической синхронизации"""
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            await asyncio.to_thread(self.sync)
+        except Exception as e:
+            logger.error("Ошибка синхронизации календаря: %s", e)
+        finally:
+            self._running.discard(task)
+
+    async def join(self):
+        """Ожидание начатой синхронизации: ее поток пишет в БД до закрытия соединений"""
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
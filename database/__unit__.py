@@ -1,4 +1,5 @@
 from .models import Booking
 from .manager import DatabaseManager
+from .async_manager import AsyncDatabaseManager
 
-__all__ = ['Booking', 'DatabaseManager']
\ No newline at end of file
+__all__ = ['Booking', 'DatabaseManager', 'AsyncDatabaseManager']
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+from typing import Any, List, Dict, Optional, Tuple
+
+from utils.profiling import trace_section
+from .models import Booking
+from .manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Число потоков, выделенных под работу с SQLite
+DATABASE_MAX_WORKERS = int(os.getenv('DATABASE_MAX_WORKERS', '2'))
+
+
+class AsyncDatabaseManager:
+    """Асинхронный интерфейс к DatabaseManager
+
+    Запросы к SQLite выполняются в выделенных потоках БД с очередью задач,
+    поэтому задержки диска не останавливают цикл опроса Telegram.
+    Набор методов совпадает с DatabaseManager.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = DATABASE_MAX_WORKERS):
+        self.manager = DatabaseManager(db_path)
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='sqlite'
+        )
+
+    async def _run(self, func, *args):
+        """Выполнение синхронного метода менеджера в потоке БД"""
+        loop = asyncio.get_running_loop()
+        with trace_section('sqlite'):
+            return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def save_booking(self, booking: Booking) -> int:
+        """Сохранение брони в БД"""
+        return await self._run(self.manager.save_booking, booking)
+
+    async def reserve_booking(self, booking: Booking, event_payload: Dict[str, Any],
+                              reminders: List[Tuple[str, float]] = ()) -> Optional[int]:
+        """Атомарное резервирование слота"""
+        return await self._run(self.manager.reserve_booking, booking, event_payload, reminders)
+
+    async def cancel_booking(self, booking_id: int):
+        """Отмена записи с постановкой удаления события в очередь"""
+        return await self._run(self.manager.cancel_booking, booking_id)
+
+    async def update_booking_status(self, booking_id: int, status: str, event_id: str = None):
+        """Обновление статуса брони"""
+        return await self._run(self.manager.update_booking_status, booking_id, status, event_id)
+
+    async def get_user_bookings(self, user_id: int) -> List[Dict]:
+        """Получение записей пользователя"""
+        return await self._run(self.manager.get_user_bookings, user_id)
+
+    async def get_confirmed_bookings(self) -> List[Dict]:
+        """Получение подтвержденных записей для напоминаний"""
+        return await self._run(self.manager.get_confirmed_bookings)
+
+    async def is_slot_booked(self, date: str, time: str) -> bool:
+        """Проверка, занят ли временной слот"""
+        return await self._run(self.manager.is_slot_booked, date, time)
+
+    async def get_booked_intervals(self, date_from: str, date_to: str) -> List[Tuple[str, str, int]]:
+        """Подтвержденные записи за период: (дата, время, длительность в минутах)"""
+        return await self._run(self.manager.get_booked_intervals, date_from, date_to)
+
+    async def get_busy_intervals(self, time_min: datetime, time_max: datetime) -> List[Tuple[datetime, datetime]]:
+        """Получение локально сохраненных интервалов занятости за период"""
+        return await self._run(self.manager.get_busy_intervals, time_min, time_max)
+
+    async def get_future_bookings_for_reminders(self, date_from: str) -> List[Dict]:
+        """Подтвержденные записи начиная с даты вместе с видами их сохраненных напоминаний"""
+        return await self._run(self.manager.get_future_bookings_for_reminders, date_from)
+
+    async def add_reminders(self, reminders: List[Tuple[int, str, float]]):
+        """Добавление напоминаний, существующие не меняются"""
+        return await self._run(self.manager.add_reminders, reminders)
+
+    async def get_due_reminders(self, due_from: float, due_to: float, limit: int = 100) -> List[Dict]:
+        """Неотправленные напоминания со временем отправки в интервале"""
+        return await self._run(self.manager.get_due_reminders, due_from, due_to, limit)
+
+    async def mark_reminders_sent(self, reminder_ids: List[int]):
+        """Отметка об отправке напоминаний"""
+        return await self._run(self.manager.mark_reminders_sent, reminder_ids)
+
+    async def fail_reminders(self, failures: List[Tuple[int, str]]):
+        """Закрытие напоминаний, которые нельзя доставить"""
+        return await self._run(self.manager.fail_reminders, failures)
+
+    async def expire_reminders(self, due_before: float, error: str) -> int:
+        """Закрытие просроченных неотправленных напоминаний"""
+        return await self._run(self.manager.expire_reminders, due_before, error)
+
+    async def retry_reminders(self, retries: List[Tuple[int, str, float]]):
+        """Перенос неудачных напоминаний на более позднее время"""
+        return await self._run(self.manager.retry_reminders, retries)
+
+    async def get_session(self, user_id: int, now: float) -> Optional[Dict]:
+        """Неистекшая сессия пользователя"""
+        return await self._run(self.manager.get_session, user_id, now)
+
+    async def save_session(self, user_id: int, data: Dict, expires_at: float):
+        """Сохранение сессии пользователя"""
+        return await self._run(self.manager.save_session, user_id, data, expires_at)
+
+    async def delete_session(self, user_id: int):
+        """Удаление сессии пользователя"""
+        return await self._run(self.manager.delete_session, user_id)
+
+    async def purge_expired_sessions(self, now: float) -> int:
+        """Удаление истекших сессий"""
+        return await self._run(self.manager.purge_expired_sessions, now)
+
+    async def close(self):
+        """Остановка потоков БД и закрытие соединений
+
+        При закрытии последнего соединения SQLite переносит WAL в основной файл.
+        """
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        self.manager.close()
@@ -1,145 +1,452 @@
+import json
 import sqlite3
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime
+import threading
+from typing import Any, List, Dict, Optional, Tuple
+from datetime import datetime, timezone
+from config import SERVICE_DURATION_HOURS, SERVICE_PRICE_RUB
+from utils.metrics import DB_SECONDS
 from .models import Booking
 
 logger = logging.getLogger(__name__)
 
+# Настройки соединения SQLite
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',       # Читатели не блокируются писателем
+    'PRAGMA synchronous=NORMAL',     # В режиме WAL надежно и без fsync на каждую транзакцию
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',       # ~8 МБ страничного кэша
+    'PRAGMA busy_timeout=5000',
+)
+
+# Длительность записей, созданных до появления услуг с разной длительностью
+DEFAULT_DURATION_MINUTES = int(SERVICE_DURATION_HOURS * 60)
+# Цена записей, созданных до сохранения цены в записи
+DEFAULT_PRICE = int(SERVICE_PRICE_RUB)
+
+
+def _minutes(time: str) -> int:
+    """'HH:MM' -> минуты от полуночи"""
+    hours, minutes = time.split(':')
+    return int(hours) * 60 + int(minutes)
+
 class DatabaseManager:
-    """Менеджер для работы с базой данных"""
+    """Менеджер для работы с базой данных
+
+    Каждый поток держит собственное постоянное соединение (небольшой пул),
+    подготовленные выражения кэшируются внутри соединения. Запись
+    сериализуется блокировкой, чтение идет параллельно благодаря WAL.
+    """
 
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
         self.init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Создание нового настроенного соединения"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5.0,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Постоянное соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._pool_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
     def init_db(self):
         """Инициализация базы данных"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Создание таблицы записей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    username TEXT,
-                    date TEXT NOT NULL,
-                    time TEXT NOT NULL,
-                    contact_info TEXT NOT NULL,
-                    event_id TEXT,
-                    status TEXT DEFAULT 'confirmed',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            with self._write_lock, self.conn as conn:
+                cursor = conn.cursor()
+
+                # Создание таблицы записей
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS bookings (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL,
+                        username TEXT,
+                        date TEXT NOT NULL,
+                        time TEXT NOT NULL,
+                        contact_info TEXT NOT NULL,
+                        event_id TEXT,
+                        status TEXT DEFAULT 'confirmed',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        service TEXT,
+                        duration_minutes INTEGER NOT NULL DEFAULT %d,
+                        price INTEGER NOT NULL DEFAULT %d
+                    )
+                ''' % (DEFAULT_DURATION_MINUTES, DEFAULT_PRICE))
+
+                # Миграция БД, созданной до появления услуг с разной длительностью
+                columns = {row[1] for row in cursor.execute('PRAGMA table_info(bookings)')}
+                if 'service' not in columns:
+                    cursor.execute('ALTER TABLE bookings ADD COLUMN service TEXT')
+                if 'duration_minutes' not in columns:
+                    cursor.execute(
+                        'ALTER TABLE bookings ADD COLUMN duration_minutes INTEGER NOT NULL DEFAULT %d'
+                        % DEFAULT_DURATION_MINUTES
+                    )
+                if 'price' not in columns:
+                    cursor.execute('ALTER TABLE bookings ADD COLUMN price INTEGER NOT NULL DEFAULT %d' % DEFAULT_PRICE)
 
-            # Создание индексов для быстрого поиска
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON bookings(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON bookings(status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_date_time ON bookings(date, time)')
+                # Создание индексов для быстрого поиска
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON bookings(user_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON bookings(status)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_date_time ON bookings(date, time)')
+
+                # Один подтвержденный слот - одна запись: защита от двойного бронирования
+                try:
+                    cursor.execute('''
+                        CREATE UNIQUE INDEX IF NOT EXISTS uq_confirmed_slot
+                        ON bookings(date, time) WHERE status = 'confirmed'
+                    ''')
+                except sqlite3.IntegrityError:
+                    logger.warning(
+                        "В БД есть дубли подтвержденных записей на один слот, "
+                        "уникальный индекс uq_confirmed_slot не создан"
+                    )
+
+                # Очередь операций с Google Calendar (outbox)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS calendar_outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        booking_id INTEGER NOT NULL,
+                        action TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at REAL NOT NULL,
+                        last_error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON calendar_outbox(next_attempt_at)')
+
+                # Напоминания о записях, переживающие перезапуск бота
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS reminders (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        booking_id INTEGER NOT NULL,
+                        kind TEXT NOT NULL,
+                        due_at REAL NOT NULL,
+                        sent_at REAL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        last_error TEXT,
+                        next_attempt_at REAL,
+                        UNIQUE (booking_id, kind)
+                    )
+                ''')
+                # Миграция БД, созданной до появления повторов отправки напоминаний
+                columns = {row[1] for row in cursor.execute('PRAGMA table_info(reminders)')}
+                if 'attempts' not in columns:
+                    cursor.execute('ALTER TABLE reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+                if 'last_error' not in columns:
+                    cursor.execute('ALTER TABLE reminders ADD COLUMN last_error TEXT')
+                if 'next_attempt_at' not in columns:
+                    cursor.execute('ALTER TABLE reminders ADD COLUMN next_attempt_at REAL')
+                # Частичный индекс: диспетчер выбирает только неотправленные напоминания
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_reminders_pending
+                    ON reminders(due_at) WHERE sent_at IS NULL
+                ''')
+
+                # Локальная копия интервалов занятости Google Calendar
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS calendar_busy (
+                        calendar_id TEXT NOT NULL,
+                        event_id TEXT NOT NULL,
+                        start_ts REAL NOT NULL,
+                        end_ts REAL NOT NULL,
+                        PRIMARY KEY (calendar_id, event_id)
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_busy_start ON calendar_busy(start_ts, end_ts)')
+
+                # Состояние инкрементальной синхронизации календарей
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS calendar_sync_state (
+                        calendar_id TEXT PRIMARY KEY,
+                        sync_token TEXT,
+                        synced_at REAL
+                    )
+                ''')
+
+                # Незавершенные сценарии записи (общие для всех процессов бота)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS booking_sessions (
+                        user_id INTEGER PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON booking_sessions(expires_at)')
 
-            conn.commit()
             logger.info("База данных инициализирована")
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка инициализации БД: {e}")
+            logger.error("Ошибка инициализации БД: %s", e)
             raise
-        finally:
-            conn.close()
 
+    @DB_SECONDS.timed()
     def save_booking(self, booking: Booking) -> int:
         """Сохранение брони в БД"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT INTO bookings (user_id, username, date, time, contact_info, event_id, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                booking.user_id, booking.username, booking.date, booking.time,
-                booking.contact_info, booking.event_id, booking.status
-            ))
+            with self._write_lock, self.conn as conn:
+                cursor = conn.execute('''
+                    INSERT INTO bookings (user_id, username, date, time, contact_info, event_id, status,
+                                          service, duration_minutes, price)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    booking.user_id, booking.username, booking.date, booking.time,
+                    booking.contact_info, booking.event_id, booking.status,
+                    booking.service, booking.duration_minutes or DEFAULT_DURATION_MINUTES,
+                    DEFAULT_PRICE if booking.price is None else booking.price
+                ))
 
             booking_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"Сохранена запись ID: {booking_id}")
+            logger.info("Сохранена запись ID: %s", booking_id)
             return booking_id
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка сохранения записи: {e}")
+            logger.error("Ошибка сохранения записи: %s", e)
             raise
-        finally:
-            conn.close()
 
-    def update_booking_status(self, booking_id: int, status: str, event_id: str = None):
-        """Обновление статуса брони"""
+    @DB_SECONDS.timed()
+    def reserve_booking(self, booking: Booking, event_payload: Dict[str, Any],
+                        reminders: List[Tuple[str, float]] = ()) -> Optional[int]:
+        """Атомарное резервирование слота
+
+        В одной транзакции сохраняет запись, задачу на создание события
+        в календаре и напоминания (вид, время отправки). Возвращает None,
+        если слот уже занят другой записью.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._write_lock, self.conn as conn:
+                cursor = conn.execute('''
+                    INSERT INTO bookings (user_id, username, date, time, contact_info, event_id, status,
+                                          service, duration_minutes, price)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    booking.user_id, booking.username, booking.date, booking.time,
+                    booking.contact_info, booking.event_id, booking.status,
+                    booking.service, booking.duration_minutes or DEFAULT_DURATION_MINUTES,
+                    DEFAULT_PRICE if booking.price is None else booking.price
+                ))
+                booking_id = cursor.lastrowid
 
-            if event_id:
-                cursor.execute(
-                    'UPDATE bookings SET status = ?, event_id = ? WHERE id = ?',
-                    (status, event_id, booking_id)
-                )
-            else:
-                cursor.execute(
-                    'UPDATE bookings SET status = ? WHERE id = ?',
-                    (status, booking_id)
+                # Уникальный индекс ловит только совпадение начала, пересечение
+                # записей разной длительности проверяется в той же транзакции
+                start = _minutes(booking.time)
+                end = start + (booking.duration_minutes or DEFAULT_DURATION_MINUTES)
+                for other_time, other_duration in conn.execute('''
+                    SELECT time, duration_minutes FROM bookings INDEXED BY idx_date_time
+                    WHERE date = ? AND status = 'confirmed' AND id != ?
+                ''', (booking.date, booking_id)):
+                    other_start = _minutes(other_time)
+                    if other_start < end and start < other_start + other_duration:
+                        raise sqlite3.IntegrityError("Запись пересекается с другой записью")
+
+                conn.execute('''
+                    INSERT INTO calendar_outbox (booking_id, action, payload, next_attempt_at)
+                    VALUES (?, 'create', ?, ?)
+                ''', (booking_id, json.dumps(event_payload), datetime.now(timezone.utc).timestamp()))
+
+                conn.executemany('''
+                    INSERT INTO reminders (booking_id, kind, due_at) VALUES (?, ?, ?)
+                ''', [(booking_id, kind, due_at) for kind, due_at in reminders])
+
+            logger.info("Зарезервирован слот %s %s, запись ID: %s", booking.date, booking.time, booking_id)
+            return booking_id
+
+        except sqlite3.IntegrityError:
+            logger.info("Слот %s %s уже занят", booking.date, booking.time)
+            return None
+        except sqlite3.Error as e:
+            logger.error("Ошибка резервирования слота: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def cancel_booking(self, booking_id: int):
+        """Отмена записи с постановкой удаления события в очередь"""
+        try:
+            with self._write_lock, self.conn as conn:
+                row = conn.execute(
+                    'SELECT event_id FROM bookings WHERE id = ?', (booking_id,)
+                ).fetchone()
+                conn.execute(
+                    "UPDATE bookings SET status = 'cancelled' WHERE id = ?", (booking_id,)
                 )
 
-            conn.commit()
-            logger.info(f"Обновлен статус записи {booking_id}: {status}")
+                # Если событие еще не создано, достаточно убрать задачу на создание
+                pending = conn.execute(
+                    "DELETE FROM calendar_outbox WHERE booking_id = ? AND action = 'create'",
+                    (booking_id,)
+                ).rowcount
+                if row and row[0] and not pending:
+                    conn.execute('''
+                        INSERT INTO calendar_outbox (booking_id, action, payload, next_attempt_at)
+                        VALUES (?, 'delete', ?, ?)
+                    ''', (booking_id, json.dumps({'event_id': row[0]}),
+                          datetime.now(timezone.utc).timestamp()))
+
+            logger.info("Обновлен статус записи %s: cancelled", booking_id)
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка обновления статуса: {e}")
+            logger.error("Ошибка отмены записи: %s", e)
             raise
-        finally:
-            conn.close()
 
+    @DB_SECONDS.timed()
+    def get_due_outbox(self, limit: int = 20) -> List[Dict]:
+        """Получение задач outbox, срок выполнения которых наступил"""
+        try:
+            rows = self.conn.execute('''
+                SELECT id, booking_id, action, payload, attempts
+                FROM calendar_outbox
+                WHERE next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            ''', (datetime.now(timezone.utc).timestamp(), limit)).fetchall()
+
+            return [
+                {
+                    'id': r[0], 'booking_id': r[1], 'action': r[2],
+                    'payload': json.loads(r[3]), 'attempts': r[4]
+                }
+                for r in rows
+            ]
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения задач outbox: %s", e)
+            return []
+
+    @DB_SECONDS.timed()
+    def complete_outbox_create(self, outbox_id: int, booking_id: int, event_id: str):
+        """Завершение задачи создания события
+
+        Если запись отменили, пока событие создавалось, ставит в очередь его удаление.
+        """
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.execute('DELETE FROM calendar_outbox WHERE id = ?', (outbox_id,))
+                conn.execute('UPDATE bookings SET event_id = ? WHERE id = ?', (event_id, booking_id))
+
+                row = conn.execute('SELECT status FROM bookings WHERE id = ?', (booking_id,)).fetchone()
+                if not row or row[0] != 'confirmed':
+                    conn.execute('''
+                        INSERT INTO calendar_outbox (booking_id, action, payload, next_attempt_at)
+                        VALUES (?, 'delete', ?, ?)
+                    ''', (booking_id, json.dumps({'event_id': event_id}),
+                          datetime.now(timezone.utc).timestamp()))
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка завершения задачи outbox %s: %s", outbox_id, e)
+            raise
+
+    @DB_SECONDS.timed()
+    def complete_outbox(self, outbox_id: int):
+        """Удаление выполненной задачи outbox"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.execute('DELETE FROM calendar_outbox WHERE id = ?', (outbox_id,))
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка завершения задачи outbox %s: %s", outbox_id, e)
+            raise
+
+    @DB_SECONDS.timed()
+    def retry_outbox(self, outbox_id: int, error: str, next_attempt_at: float):
+        """Перенос неудачной задачи outbox на более позднее время"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.execute('''
+                    UPDATE calendar_outbox
+                    SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+                    WHERE id = ?
+                ''', (error, next_attempt_at, outbox_id))
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка обновления задачи outbox %s: %s", outbox_id, e)
+            raise
+
+    @DB_SECONDS.timed()
+    def update_booking_status(self, booking_id: int, status: str, event_id: str = None):
+        """Обновление статуса брони"""
+        try:
+            with self._write_lock, self.conn as conn:
+                if event_id:
+                    conn.execute(
+                        'UPDATE bookings SET status = ?, event_id = ? WHERE id = ?',
+                        (status, event_id, booking_id)
+                    )
+                else:
+                    conn.execute(
+                        'UPDATE bookings SET status = ? WHERE id = ?',
+                        (status, booking_id)
+                    )
+
+            logger.info("Обновлен статус записи %s: %s", booking_id, status)
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка обновления статуса: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
     def get_user_bookings(self, user_id: int) -> List[Dict]:
         """Получение записей пользователя"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT id, date, time, contact_info, status, created_at
+            bookings = self.conn.execute('''
+                SELECT id, date, time, contact_info, status, created_at, service, price
                 FROM bookings
                 WHERE user_id = ?
                 ORDER BY date DESC, time DESC
-            ''', (user_id,))
+            ''', (user_id,)).fetchall()
 
-            bookings = cursor.fetchall()
             return [
                 {
                     'id': b[0], 'date': b[1], 'time': b[2],
-                    'contact_info': b[3], 'status': b[4], 'created_at': b[5]
+                    'contact_info': b[3], 'status': b[4], 'created_at': b[5], 'service': b[6],
+                    'price': b[7]
                 }
                 for b in bookings
             ]
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка получения записей пользователя: {e}")
+            logger.error("Ошибка получения записей пользователя: %s", e)
             return []
-        finally:
-            conn.close()
 
+    @DB_SECONDS.timed()
     def get_confirmed_bookings(self) -> List[Dict]:
         """Получение подтвержденных записей для напоминаний"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
+            bookings = self.conn.execute('''
                 SELECT id, user_id, date, time, contact_info, event_id
                 FROM bookings
                 WHERE status = 'confirmed'
-            ''')
+            ''').fetchall()
 
-            bookings = cursor.fetchall()
             return [
                 {
                     'id': b[0], 'user_id': b[1], 'date': b[2],
@@ -149,27 +456,304 @@ class DatabaseManager:
             ]
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка получения подтвержденных записей: {e}")
+            logger.error("Ошибка получения подтвержденных записей: %s", e)
             return []
-        finally:
-            conn.close()
 
+    @DB_SECONDS.timed()
     def is_slot_booked(self, date: str, time: str) -> bool:
         """Проверка, занят ли временной слот"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
+            count = self.conn.execute('''
                 SELECT COUNT(*) FROM bookings
                 WHERE date = ? AND time = ? AND status = 'confirmed'
-            ''', (date, time))
+            ''', (date, time)).fetchone()[0]
 
-            count = cursor.fetchone()[0]
             return count > 0
 
         except sqlite3.Error as e:
-            logger.error(f"Ошибка проверки слота: {e}")
+            logger.error("Ошибка проверки слота: %s", e)
             return True  # В случае ошибки считаем слот занятым
-        finally:
-            conn.close()
\ No newline at end of file
+
+    @DB_SECONDS.timed()
+    def get_booked_intervals(self, date_from: str, date_to: str) -> List[Tuple[str, str, int]]:
+        """Подтвержденные записи за период: (дата, время, длительность в минутах)"""
+        try:
+            return self.conn.execute('''
+                SELECT date, time, duration_minutes FROM bookings INDEXED BY idx_date_time
+                WHERE date BETWEEN ? AND ? AND status = 'confirmed'
+            ''', (date_from, date_to)).fetchall()
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения занятых слотов: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def get_busy_intervals(self, time_min: datetime, time_max: datetime) -> List[Tuple[datetime, datetime]]:
+        """Получение локально сохраненных интервалов занятости за период"""
+        try:
+            rows = self.conn.execute('''
+                SELECT start_ts, end_ts FROM calendar_busy
+                WHERE start_ts < ? AND end_ts > ?
+            ''', (time_max.timestamp(), time_min.timestamp())).fetchall()
+
+            return [
+                (datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc))
+                for start, end in rows
+            ]
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения интервалов занятости: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def get_sync_state(self, calendar_id: str) -> Tuple[Optional[str], Optional[float]]:
+        """Получение токена синхронизации и времени последней синхронизации"""
+        try:
+            row = self.conn.execute(
+                'SELECT sync_token, synced_at FROM calendar_sync_state WHERE calendar_id = ?',
+                (calendar_id,)
+            ).fetchone()
+            return row if row else (None, None)
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения состояния синхронизации: %s", e)
+            return None, None
+
+    @DB_SECONDS.timed()
+    def apply_busy_changes(self, calendar_id: str, upserts: List[Tuple[str, float, float]],
+                           deleted_ids: List[str], sync_token: Optional[str],
+                           full_resync: bool = False, prune_before: Optional[float] = None):
+        """Применение страницы изменений интервалов занятости в одной транзакции
+
+        full_resync удаляет прежние интервалы и токен календаря. Токен и время
+        синхронизации сохраняются только вместе с последней страницей.
+        """
+        try:
+            with self._write_lock, self.conn as conn:
+                if full_resync:
+                    conn.execute('DELETE FROM calendar_busy WHERE calendar_id = ?', (calendar_id,))
+                    conn.execute('DELETE FROM calendar_sync_state WHERE calendar_id = ?', (calendar_id,))
+                elif deleted_ids:
+                    conn.executemany(
+                        'DELETE FROM calendar_busy WHERE calendar_id = ? AND event_id = ?',
+                        [(calendar_id, event_id) for event_id in deleted_ids]
+                    )
+
+                conn.executemany('''
+                    INSERT OR REPLACE INTO calendar_busy (calendar_id, event_id, start_ts, end_ts)
+                    VALUES (?, ?, ?, ?)
+                ''', [(calendar_id, event_id, start, end) for event_id, start, end in upserts])
+
+                if prune_before is not None:
+                    conn.execute(
+                        'DELETE FROM calendar_busy WHERE calendar_id = ? AND end_ts < ?',
+                        (calendar_id, prune_before)
+                    )
+
+                if sync_token:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO calendar_sync_state (calendar_id, sync_token, synced_at)
+                        VALUES (?, ?, ?)
+                    ''', (calendar_id, sync_token, datetime.now(timezone.utc).timestamp()))
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка сохранения интервалов занятости: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def get_future_bookings_for_reminders(self, date_from: str) -> List[Dict]:
+        """Подтвержденные записи начиная с даты вместе с видами их сохраненных напоминаний
+
+        Один диапазонный запрос по индексу idx_date_time вместо полного
+        чтения всех подтвержденных записей.
+        """
+        try:
+            rows = self.conn.execute('''
+                SELECT b.id, b.user_id, b.username, b.date, b.time, b.contact_info, b.event_id,
+                       group_concat(r.kind)
+                FROM bookings AS b INDEXED BY idx_date_time
+                LEFT JOIN reminders AS r ON r.booking_id = b.id
+                WHERE b.date >= ? AND b.status = 'confirmed'
+                GROUP BY b.id
+            ''', (date_from,)).fetchall()
+
+            return [
+                {
+                    'id': r[0], 'user_id': r[1], 'username': r[2], 'date': r[3],
+                    'time': r[4], 'contact_info': r[5], 'event_id': r[6],
+                    'reminder_kinds': set(r[7].split(',')) if r[7] else set()
+                }
+                for r in rows
+            ]
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения записей для напоминаний: %s", e)
+            return []
+
+    @DB_SECONDS.timed()
+    def add_reminders(self, reminders: List[Tuple[int, str, float]]):
+        """Добавление напоминаний (запись, вид, время отправки), существующие не меняются"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO reminders (booking_id, kind, due_at) VALUES (?, ?, ?)
+                ''', reminders)
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка добавления напоминаний: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def get_due_reminders(self, due_from: float, due_to: float, limit: int = 100) -> List[Dict]:
+        """Неотправленные напоминания со временем отправки в интервале
+
+        Напоминания, отложенные после временной ошибки, возвращаются только
+        после наступления next_attempt_at.
+        """
+        try:
+            rows = self.conn.execute('''
+                SELECT r.id, r.kind, b.id, b.user_id, b.username, b.date, b.time, b.contact_info, b.service,
+                       b.price, r.attempts, r.due_at
+                FROM reminders AS r INDEXED BY idx_reminders_pending
+                JOIN bookings AS b ON b.id = r.booking_id
+                WHERE r.sent_at IS NULL AND r.due_at BETWEEN ? AND ?
+                  AND (r.next_attempt_at IS NULL OR r.next_attempt_at <= ?)
+                  AND b.status = 'confirmed'
+                ORDER BY r.due_at
+                LIMIT ?
+            ''', (due_from, due_to, due_to, limit)).fetchall()
+
+            return [
+                {
+                    'id': r[0], 'kind': r[1], 'booking_id': r[2], 'user_id': r[3],
+                    'username': r[4], 'date': r[5], 'time': r[6], 'contact_info': r[7],
+                    'service': r[8], 'price': r[9], 'attempts': r[10],
+                    'due_at': r[11]
+                }
+                for r in rows
+            ]
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения напоминаний к отправке: %s", e)
+            return []
+
+    @DB_SECONDS.timed()
+    def mark_reminders_sent(self, reminder_ids: List[int]):
+        """Отметка об отправке напоминаний"""
+        try:
+            sent_at = datetime.now(timezone.utc).timestamp()
+            with self._write_lock, self.conn as conn:
+                conn.executemany(
+                    'UPDATE reminders SET sent_at = ? WHERE id = ?',
+                    [(sent_at, reminder_id) for reminder_id in reminder_ids]
+                )
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка отметки напоминаний: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def fail_reminders(self, failures: List[Tuple[int, str]]):
+        """Закрытие напоминаний, которые нельзя доставить (id, ошибка)
+
+        sent_at заполняется, чтобы напоминание больше не выбиралось,
+        причина сохраняется в last_error.
+        """
+        try:
+            failed_at = datetime.now(timezone.utc).timestamp()
+            with self._write_lock, self.conn as conn:
+                conn.executemany(
+                    'UPDATE reminders SET sent_at = ?, attempts = attempts + 1, last_error = ? WHERE id = ?',
+                    [(failed_at, error, reminder_id) for reminder_id, error in failures]
+                )
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка отметки напоминаний: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def expire_reminders(self, due_before: float, error: str) -> int:
+        """Закрытие неотправленных напоминаний со временем отправки раньше due_before
+
+        Такие напоминания уже не выбираются get_due_reminders (опоздали,
+        запись отменена, повтор вышел за срок), и без закрытия навсегда
+        остались бы в индексе idx_reminders_pending.
+        """
+        try:
+            expired_at = datetime.now(timezone.utc).timestamp()
+            with self._write_lock, self.conn as conn:
+                cursor = conn.execute('''
+                    UPDATE reminders INDEXED BY idx_reminders_pending
+                    SET sent_at = ?, last_error = COALESCE(last_error, ?)
+                    WHERE sent_at IS NULL AND due_at < ?
+                ''', (expired_at, error, due_before))
+            return cursor.rowcount
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка закрытия просроченных напоминаний: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def retry_reminders(self, retries: List[Tuple[int, str, float]]):
+        """Перенос неудачных напоминаний на более позднее время (id, ошибка, время повтора)"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.executemany('''
+                    UPDATE reminders
+                    SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+                    WHERE id = ?
+                ''', [(error, next_attempt_at, reminder_id) for reminder_id, error, next_attempt_at in retries])
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка обновления напоминаний: %s", e)
+            raise
+
+    @DB_SECONDS.timed()
+    def get_session(self, user_id: int, now: float) -> Optional[Dict]:
+        """Неистекшая сессия пользователя"""
+        try:
+            row = self.conn.execute(
+                'SELECT data FROM booking_sessions WHERE user_id = ? AND expires_at > ?',
+                (user_id, now)
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения сессии пользователя %s: %s", user_id, e)
+            return None
+
+    @DB_SECONDS.timed()
+    def save_session(self, user_id: int, data: Dict, expires_at: float):
+        """Сохранение сессии пользователя"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO booking_sessions (user_id, data, expires_at) VALUES (?, ?, ?)',
+                    (user_id, json.dumps(data, ensure_ascii=False), expires_at)
+                )
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка сохранения сессии пользователя %s: %s", user_id, e)
+            raise
+
+    @DB_SECONDS.timed()
+    def delete_session(self, user_id: int):
+        """Удаление сессии пользователя"""
+        try:
+            with self._write_lock, self.conn as conn:
+                conn.execute('DELETE FROM booking_sessions WHERE user_id = ?', (user_id,))
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка удаления сессии пользователя %s: %s", user_id, e)
+            raise
+
+    @DB_SECONDS.timed()
+    def purge_expired_sessions(self, now: float) -> int:
+        """Удаление истекших сессий, возвращает число удаленных"""
+        try:
+            with self._write_lock, self.conn as conn:
+                return conn.execute('DELETE FROM booking_sessions WHERE expires_at <= ?', (now,)).rowcount
+
+        except sqlite3.Error as e:
+            logger.error("Ошибка очистки сессий: %s", e)
+            return 0
@@ -12,6 +12,9 @@ class Booking:
     contact_info: str
     event_id: Optional[str] = None
     status: str = "confirmed"  # confirmed, cancelled
+    service: Optional[str] = None  # ключ услуги из services.catalog
+    duration_minutes: Optional[int] = None
+    price: Optional[int] = None  # цена на момент записи
     created_at: Optional[datetime] = field(default_factory=datetime.now)
     id: Optional[int] = None
 
@@ -26,6 +29,9 @@ class Booking:
             'contact_info': self.contact_info,
             'event_id': self.event_id,
             'status': self.status,
+            'service': self.service,
+            'duration_minutes': self.duration_minutes,
+            'price': self.price,
             'created_at': self.created_at
         }
 
@@ -1,46 +1,126 @@
 import logging
 import asyncio
+import atexit
+import queue
 import sys
 import os
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, PicklePersistence
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from datetime import datetime, timezone
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from config import BOT_TOKEN
 from bot.handlers import BotHandlers
+from bot.webhook import run_webhook
+from bot.concurrency import PerUserUpdateProcessor
+from bot.persistence import SQLitePersistence
+from bot.sessions import SESSION_PURGE_INTERVAL, purge_expired_sessions
+from utils.helpers import restore_booking_reminders
+from utils.profiling import SLOW_UPDATE_PROFILING, TracedHTTPXRequest, is_trace_record, trace_log_handler
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# Логирование: файл, уровень и ротация (по размеру или, если задан LOG_ROTATE_WHEN, по времени)
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+# Интервал ротации для TimedRotatingFileHandler: midnight, H, D, W0...
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler, оставляющий форматирование записи потоку QueueListener
+
+    Стандартный prepare() форматирует сообщение и трассировку исключения
+    прямо в потоке, вызвавшем логгер, то есть в цикле событий.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
 
 def setup_logging():
-    """Настройка логирования с поддержкой Unicode"""
+    """Настройка логирования через очередь: запись в файл и консоль в отдельном потоке"""
     # Настраиваем кодировку для Windows
     if sys.platform == "win32":
         os.environ["PYTHONIOENCODING"] = "utf-8"
 
-    # Создаем форматтер без эмодзи для файла
-    file_formatter = logging.Formatter(
+    formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
-    # Создаем форматтер с эмодзи для консоли (если поддерживается)
-    try:
-        console_formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    # Файловый хандлер с ротацией по размеру или по времени
+    if LOG_ROTATE_WHEN:
+        file_handler = TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS, encoding='utf-8'
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8'
         )
-    except:
-        console_formatter = file_formatter
+    file_handler.setFormatter(formatter)
+
+    # Консольный хандлер
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    handlers = [file_handler, console_handler]
+    if SLOW_UPDATE_PROFILING:
+        # Трассировки медленных обновлений пишет тот же listener, но в отдельный файл
+        for handler in handlers:
+            handler.addFilter(lambda record: not is_trace_record(record))
+        handlers.append(trace_log_handler())
+
+    # Логгеры только кладут запись в очередь, диск и консоль - в потоке listener
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
 
-    # Настройка логгера
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_DeferredQueueHandler(log_queue))
 
-    # Файловый хандлер (без эмодзи)
-    file_handler = logging.FileHandler('bot.log', encoding='utf-8')
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+def register_handlers(application: Application, handlers: BotHandlers):
+    """Регистрация обработчиков команд и кнопок"""
+    application.add_handler(CommandHandler("start", handlers.start))
+    application.add_handler(CommandHandler("help", handlers.help_command))
+    application.add_handler(CommandHandler("mybookings", handlers.my_bookings))
+    application.add_handler(CommandHandler("stats", handlers.stats_command))
+    application.add_handler(CallbackQueryHandler(handlers.button_handler))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_contact_info))
 
-    # Консольный хандлер
-    try:
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
-    except:
-        pass  # Игнорируем ошибки консольного вывода
+def schedule_jobs(application: Application, handlers: BotHandlers):
+    """Фоновые задачи: синхронизация календаря, outbox, напоминания, очистка сессий"""
+    # Задачи добавляются до запуска планировщика, и с first=0 APScheduler переносит
+    # первый запуск на целый интервал. Явное next_run_time запускает их сразу после старта
+    run_now = {'next_run_time': datetime.now(timezone.utc), 'misfire_grace_time': None}
+
+    # Фоновая синхронизация занятости календаря в локальную БД
+    calendar_sync = handlers.booking_service.calendar_sync
+    application.job_queue.run_repeating(
+        calendar_sync.run, interval=calendar_sync.interval, name='calendar_sync',
+        job_kwargs=run_now
+    )
+
+    # Фоновая обработка очереди операций с календарем
+    calendar_outbox = handlers.booking_service.calendar_outbox
+    application.job_queue.run_repeating(
+        calendar_outbox.run, interval=calendar_outbox.interval, name='calendar_outbox',
+        job_kwargs=run_now
+    )
+
+    # Единый диспетчер напоминаний вместо отдельной задачи на каждое напоминание
+    reminder_dispatcher = handlers.booking_service.reminder_dispatcher
+    application.job_queue.run_repeating(
+        reminder_dispatcher.run, interval=reminder_dispatcher.interval, name='reminder_dispatcher',
+        job_kwargs=run_now
+    )
+
+    # Удаление брошенных сессий записи
+    application.job_queue.run_repeating(
+        purge_expired_sessions, interval=SESSION_PURGE_INTERVAL, first=SESSION_PURGE_INTERVAL,
+        data=handlers.sessions, name='session_purge'
+    )
 
 def main():
     """Основная функция запуска бота"""
@@ -49,28 +129,63 @@ def main():
 
     try:
         # 1. Создаем объект персистентности.
-        # Он будет хранить данные в файле 'bot_persistence'
-        persistence = PicklePersistence(filepath='bot_persistence')
-        # Создание приложения
-        #application = Application.builder().token(BOT_TOKEN).build()
-        application = Application.builder().token(BOT_TOKEN).persistence(persistence).build()
+        # Данные хранятся в SQLite (PERSISTENCE_PATH), изменения пишутся построчно
+        persistence = SQLitePersistence()
 
         # Создание обработчиков
         handlers = BotHandlers()
 
-        # Регистрация обработчиков
-        application.add_handler(CommandHandler("start", handlers.start))
-        application.add_handler(CommandHandler("help", handlers.help_command))
-        application.add_handler(CommandHandler("mybookings", handlers.my_bookings))
-        application.add_handler(CallbackQueryHandler(handlers.button_handler))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_contact_info))
+        async def post_init(application: Application):
+            """Запуск очереди исходящих сообщений и восстановление напоминаний"""
+            handlers.sender.start(application.bot)
+            # Клиент Google готовится в фоне и не задерживает ответы на /start и /help
+            application.create_task(handlers.booking_service.calendar.warm_up())
+            await restore_booking_reminders(handlers.booking_service.db)
+
+        async def post_stop(application: Application):
+            """Отправка оставшихся сообщений, пока клиент бота еще открыт"""
+            # JobQueue.stop() не ждет начатых задач: диспетчеру нужен работающий отправитель
+            await handlers.booking_service.reminder_dispatcher.join()
+            await handlers.sender.stop()
+
+        async def post_shutdown(application: Application):
+            """Освобождение потоков и соединений"""
+            # Синхронизация и outbox пишут в БД из потоков to_thread - дожидаемся их
+            await handlers.booking_service.calendar_sync.join()
+            await handlers.booking_service.calendar_outbox.join()
+            await handlers.booking_service.calendar.shutdown()
+            # БД закрывается последней
+            await handlers.booking_service.db.close()
+
+        # Создание приложения
+        #application = Application.builder().token(BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .persistence(persistence)
+            # Разные пользователи обрабатываются параллельно, один пользователь - по порядку
+            .concurrent_updates(PerUserUpdateProcessor())
+            .post_init(post_init)
+            .post_stop(post_stop)
+            .post_shutdown(post_shutdown)
+        )
+        if SLOW_UPDATE_PROFILING:
+            # Время запросов к Bot API попадает в трассировки медленных обновлений
+            builder = builder.request(TracedHTTPXRequest(connection_pool_size=256))
+        application = builder.build()
+
+        register_handlers(application, handlers)
+        schedule_jobs(application, handlers)
 
         # Запуск бота
-        logger.info("Бот запущен и готов к работе")
-        application.run_polling()
+        logger.info("Бот запущен и готов к работе (режим: %s)", BOT_MODE)
+        if BOT_MODE == 'webhook':
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
 
     except Exception as e:
-        logger.error(f"Критическая ошибка при запуске бота: {e}")
+        logger.error("Критическая ошибка при запуске бота: %s", e)
         raise
 
 if __name__ == '__main__':
@@ -1,3 +1,6 @@
 from .booking import BookingService
+from .availability_cache import AvailabilityCache
+from .reminders import ReminderDispatcher
+from .catalog import Service, SERVICES, get_service
 
-__all__ = ['BookingService']
\ No newline at end of file
+__all__ = ['BookingService', 'AvailabilityCache', 'ReminderDispatcher', 'Service', 'SERVICES', 'get_service']
\ No newline at end of file
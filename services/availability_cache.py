@@ -0,0 +1,70 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List
+
+from cachetools import TTLCache
+
+from database.models import TimeSlot
+
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша доступных слотов (секунды)
+AVAILABILITY_CACHE_TTL = float(os.getenv('AVAILABILITY_CACHE_TTL', '30'))
+
+
+class AvailabilityCache:
+    """Общий TTL-кэш доступных слотов
+
+    Экран выбора даты, экран выбора времени и параллельно работающие
+    пользователи получают один и тот же результат из памяти. Одновременные
+    промахи по одному ключу объединяются в одну загрузку.
+    """
+
+    def __init__(self, ttl: float = AVAILABILITY_CACHE_TTL, maxsize: int = 8):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        # Увеличивается при инвалидации, чтобы загрузка, начатая до неё,
+        # не вернула в кэш устаревшие данные
+        self._generation = 0
+
+    async def get_or_load(self, key: Hashable,
+                          loader: Callable[[], Awaitable[List[TimeSlot]]]) -> List[TimeSlot]:
+        """Получение слотов из кэша или загрузка через loader"""
+        slots = self._cache.get(key)
+        if slots is not None:
+            return slots
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        generation = self._generation
+        try:
+            slots = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано вызывающему, ожидающие получат его из future
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            # Пустой результат может означать ошибку календаря - не кэшируем его
+            if slots and generation == self._generation:
+                self._cache[key] = slots
+            future.set_result(slots)
+            return slots
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def invalidate(self):
+        """Сброс кэша после изменения записей"""
+        self._generation += 1
+        self._cache.clear()
+        self._pending.clear()
+        logger.debug("Кэш доступных слотов сброшен")
@@ -1,79 +1,176 @@
+import uuid
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
 from pytz import timezone
-from config import DATABASE_PATH
-from database.manager import DatabaseManager, Booking
+from config import DATABASE_PATH, DAYS_AHEAD_BOOKING
+from database.manager import Booking
+from database.async_manager import AsyncDatabaseManager
 from database.models import TimeSlot
-from calendar_api.manager import GoogleCalendarManager
+from calendar_api.async_manager import AsyncGoogleCalendarManager
+from calendar_api.busy_index import BusyIntervalIndex
+from calendar_api.sync import CalendarSync
+from calendar_api.outbox import CalendarOutboxWorker
+from utils.helpers import get_reminder_times
+from .availability_cache import AvailabilityCache
+from .catalog import Service, DEFAULT_SERVICE
+from .reminders import ReminderDispatcher
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=65536)
+def _booking_bounds(date: str, time: str, duration_minutes: int) -> Tuple[float, float]:
+    """Границы записи в секундах epoch; записи не меняются, поэтому результат кэшируется"""
+    start = timezone('Europe/Minsk').localize(datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M"))
+    return start.timestamp(), start.timestamp() + duration_minutes * 60
+
+
 class BookingService:
     """Сервис для управления записями"""
 
-    def __init__(self):
-        self.db = DatabaseManager(DATABASE_PATH)
-        self.calendar = GoogleCalendarManager()
+    def __init__(self, sender=None, db_path: Optional[str] = None, calendar_manager=None):
+        # db_path и calendar_manager задаются нагрузочным тестом, иначе берутся из настроек
+        self.db = AsyncDatabaseManager(db_path or DATABASE_PATH)
+        self.calendar = AsyncGoogleCalendarManager(calendar_manager)
+        self.availability_cache = AvailabilityCache()
+        self.calendar_sync = CalendarSync(self.calendar.manager, self.db.manager)
+        self.calendar_outbox = CalendarOutboxWorker(self.calendar.manager, self.db.manager)
+        self.reminder_dispatcher = ReminderDispatcher(self.db, sender)
+
+    def _horizon_key(self, service: Service):
+        """Ключ кэша - текущий горизонт бронирования и услуга"""
+        today = datetime.now(timezone('Europe/Minsk')).date()
+        return today.isoformat(), DAYS_AHEAD_BOOKING, service.key
+
+    async def get_available_slots(self, service: Service = DEFAULT_SERVICE) -> List[TimeSlot]:
+        """Получение доступных временных слотов для услуги (с кэшированием)"""
+        try:
+            return await self.availability_cache.get_or_load(
+                self._horizon_key(service), lambda: self._load_available_slots(service)
+            )
+        except Exception as e:
+            logger.error("Ошибка получения доступных слотов: %s", e)
+            return []
 
-    def get_available_slots(self) -> List[TimeSlot]:
-        """Получение доступных временных слотов"""
+    async def _load_available_slots(self, service: Service) -> List[TimeSlot]:
+        """Загрузка доступных слотов из календаря и БД"""
         try:
-            # Получаем слоты из календаря
-            calendar_slots = self.calendar.get_available_slots()
+            now = datetime.now(timezone('Europe/Minsk'))
+            if self.calendar_sync.is_fresh():
+                # Занятость берем из локальной копии календаря, без запроса к Google
+                busy_index = await self._local_busy_index()
+            else:
+                # Локальная копия еще не готова - запрашиваем календарь напрямую
+                busy_index = BusyIntervalIndex(await self.calendar.get_busy_intervals(
+                    now, now + timedelta(days=DAYS_AHEAD_BOOKING + 1)
+                ))
+
+            # Записи из БД занимают время с учетом своей длительности, поэтому
+            # короткая услуга не попадет внутрь уже записанной длинной
+            booked = await self.db.get_booked_intervals(
+                now.date().isoformat(), (now.date() + timedelta(days=DAYS_AHEAD_BOOKING)).isoformat()
+            )
+            for date, time, duration_minutes in booked:
+                busy_index.add_ts(*_booking_bounds(date, time, duration_minutes))
 
-            # Фильтруем уже забронированные слоты
-            available_slots = []
-            for slot in calendar_slots:
-                if not self.db.is_slot_booked(slot.date, slot.time):
-                    available_slots.append(slot)
+            available_slots = await self.calendar.get_available_slots(busy_index, service.duration_minutes)
 
-            logger.info(f"Доступно {len(available_slots)} временных слотов")
+            logger.info("Доступно %s временных слотов", len(available_slots))
             return available_slots
 
         except Exception as e:
-            logger.error(f"Ошибка получения доступных слотов: {e}")
+            logger.error("Ошибка получения доступных слотов: %s", e)
             return []
 
-    def is_slot_taken(self, date: str, time: str) -> bool:
-        """Проверка занятости слота"""
-        try:
-            # Проверяем в базе данных
-            if self.db.is_slot_booked(date, time):
-                return True
+    async def _local_busy_index(self) -> BusyIntervalIndex:
+        """Индекс занятости по локальной копии календаря"""
+        now = datetime.now(timezone('Europe/Minsk'))
+        intervals = await self.db.get_busy_intervals(now, now + timedelta(days=DAYS_AHEAD_BOOKING + 1))
+        return BusyIntervalIndex(intervals)
+
+    async def is_slot_taken(self, date: str, time: str, service: Service = DEFAULT_SERVICE) -> bool:
+        """Быстрая проверка занятости слота без запроса к Google
 
-            # Проверяем в календаре
-            slot_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-            return not self.calendar.is_slot_available(slot_datetime)
+        Используются те же кэшированные или локальные данные о занятости,
+        что и при выводе списка слотов: записи из БД в них уже учтены.
+        Гонку двух подтверждений исключает уникальный индекс в reserve_booking,
+        а окончательная проверка по календарю выполняется при подтверждении записи.
+        """
+        try:
+            available_slots = await self.get_available_slots(service)
+            return not any(slot.date == date and slot.time == time for slot in available_slots)
 
         except Exception as e:
-            logger.error(f"Ошибка проверки занятости слота: {e}")
+            logger.error("Ошибка проверки занятости слота: %s", e)
             return True  # В случае ошибки считаем занятым
 
-    async def create_booking(self, user_id: int, username: str, date: str, time: str, contact_info: str) -> Dict:
-        """Создание записи"""
-        try:
-            # Создаем событие в календаре
-            client_info = f"@{username}" if username else f"ID: {user_id}"
-            event_id = self.calendar.create_event(date, time, client_info, contact_info)
+    async def _is_calendar_slot_free(self, date: str, time: str, service: Service) -> bool:
+        """Окончательная проверка слота по календарю перед записью
+
+        Всегда выполняется одним запросом FreeBusy: локальная копия может
+        отставать на несколько интервалов синхронизации и годится только
+        для вывода списка слотов.
+        """
+        slot_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+        return await self.calendar.is_slot_available(slot_datetime, service.duration_minutes)
+
+    async def create_booking(self, user_id: int, username: str, date: str, time: str, contact_info: str,
+                             service: Service = DEFAULT_SERVICE) -> Dict:
+        """Создание записи
 
-            if not event_id:
-                return {'success': False, 'error': 'Не удалось создать событие в календаре'}
+        Слот резервируется одной локальной транзакцией (уникальный индекс
+        исключает двойное бронирование), событие в календаре создается
+        фоновым обработчиком очереди.
+        """
+        try:
+            if not await self._is_calendar_slot_free(date, time, service):
+                # Слот заняли в календаре, пока пользователь вводил контакты
+                self.availability_cache.invalidate()
+                return {'success': False, 'slot_taken': True, 'error': 'Слот уже занят'}
 
-            # Создаем запись в базе данных
+            client_info = f"@{username}" if username else f"ID: {user_id}"
             booking = Booking(
                 user_id=user_id,
                 username=username,
                 date=date,
                 time=time,
                 contact_info=contact_info,
-                event_id=event_id,
-                status="confirmed"
+                status="confirmed",
+                service=service.key,
+                duration_minutes=service.duration_minutes,
+                price=service.price
             )
+            event_payload = {
+                'date': date,
+                'time': time,
+                'client_info': client_info,
+                'contact_info': contact_info,
+                'service_name': service.name,
+                'duration_minutes': service.duration_minutes,
+                'price': service.price,
+                # Идентификатор события задается заранее, чтобы повторы не создавали дубликатов
+                'event_id': uuid.uuid4().hex,
+            }
+
+            # Как и при восстановлении, уже наступившие напоминания не создаются:
+            # запись меньше чем за час не должна сразу получать «через час»
+            now = datetime.now(timezone('Europe/Minsk'))
+            reminders = [
+                (kind, due_at.timestamp()) for kind, due_at in get_reminder_times(date, time)
+                if due_at > now
+            ]
+
+            booking_id = await self.db.reserve_booking(booking, event_payload, reminders)
+            self.availability_cache.invalidate()
+            if booking_id is None:
+                return {'success': False, 'slot_taken': True, 'error': 'Слот уже занят'}
 
-            booking_id = self.db.save_booking(booking)
+            booking.id = booking_id
+            self.calendar_outbox.wake()
 
-            logger.info(f"Создана запись {booking_id} для пользователя {user_id}")
+            logger.info("Создана запись %s для пользователя %s", booking_id, user_id)
 
             return {
                 'success': True,
@@ -82,16 +179,16 @@ class BookingService:
             }
 
         except Exception as e:
-            logger.error(f"Ошибка создания записи: {e}")
+            logger.error("Ошибка создания записи: %s", e)
             return {'success': False, 'error': str(e)}
 
-    def get_user_bookings(self, user_id: int) -> List[Dict]:
+    async def get_user_bookings(self, user_id: int) -> List[Dict]:
         """Получение всех записей пользователя"""
-        return self.db.get_user_bookings(user_id)
+        return await self.db.get_user_bookings(user_id)
 
-    def get_user_future_bookings(self, user_id: int):
+    async def get_user_future_bookings(self, user_id: int):
         """Получение только предстоящих записей пользователя."""
-        all_bookings = self.db.get_user_bookings(user_id)
+        all_bookings = await self.db.get_user_bookings(user_id)
         future_bookings = []
 
         # Определяем текущее время в нужном часовом поясе
@@ -112,13 +209,14 @@ class BookingService:
                 future_bookings.append(booking)
 
         return future_bookings
-    def cancel_booking(self, booking_id: int) -> bool:
+    async def cancel_booking(self, booking_id: int) -> bool:
         """Отмена записи"""
         try:
-            # Здесь можно добавить логику отмены
-            # Например, удаление события из календаря и обновление статуса в БД
-            self.db.update_booking_status(booking_id, "cancelled")
+            # Событие удаляется из календаря фоновым обработчиком очереди
+            await self.db.cancel_booking(booking_id)
+            self.availability_cache.invalidate()
+            self.calendar_outbox.wake()
             return True
         except Exception as e:
-            logger.error(f"Ошибка отмены записи {booking_id}: {e}")
+            logger.error("Ошибка отмены записи %s: %s", booking_id, e)
             return False
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from config import SERVICE_NAME, SERVICE_DURATION_HOURS, SERVICE_PRICE_RUB
+
+# Список услуг: "ключ:название:минуты:цена" через точку с запятой, например
+# consult:Консультация:60:3000;express:Экспресс-консультация:30:1500
+# Если не задан, используется одна услуга из SERVICE_NAME/SERVICE_DURATION_HOURS/SERVICE_PRICE_RUB
+SERVICES_SPEC = os.getenv('SERVICES', '')
+
+
+@dataclass(frozen=True)
+class Service:
+    """Услуга с собственной длительностью и ценой"""
+    key: str
+    name: str
+    duration_minutes: int
+    price: int
+
+
+DEFAULT_SERVICE_KEY = 'default'
+
+# Самая длинная callback_data с ключом услуги - select_time_<ключ>_YYYY-MM-DD_HH-MM,
+# а Telegram принимает не больше 64 байт
+MAX_SERVICE_KEY_BYTES = 64 - len('select_time__YYYY-MM-DD_HH-MM')
+
+
+def parse_services(spec: str) -> Tuple[Service, ...]:
+    """Разбор списка услуг из строки настроек
+
+    Ошибки формата сообщаются через ValueError с указанием услуги.
+    """
+    services, keys = [], set()
+    for item in filter(None, (part.strip() for part in spec.split(';'))):
+        fields = [value.strip() for value in item.split(':')]
+        if len(fields) != 4:
+            raise ValueError(
+                f"Услуга {item!r}: ожидается 'ключ:название:минуты:цена', получено полей: {len(fields)} "
+                "(символ ':' в названии не допускается)"
+            )
+        key, name, minutes, price = fields
+        # Ключ входит в callback_data, где '_' - разделитель
+        if not key or '_' in key:
+            raise ValueError(f"Услуга {item!r}: некорректный ключ {key!r} (пустой или содержит '_')")
+        if len(key.encode()) > MAX_SERVICE_KEY_BYTES:
+            raise ValueError(
+                f"Услуга {item!r}: ключ длиннее {MAX_SERVICE_KEY_BYTES} байт "
+                "не помещается в callback_data Telegram (64 байта)"
+            )
+        if key in keys:
+            raise ValueError(f"Услуга {item!r}: ключ {key!r} уже используется")
+        try:
+            duration_minutes, price_value = int(minutes), int(price)
+        except ValueError:
+            raise ValueError(f"Услуга {item!r}: длительность и цена должны быть целыми числами") from None
+        if duration_minutes <= 0 or price_value < 0:
+            raise ValueError(f"Услуга {item!r}: длительность должна быть положительной, цена - неотрицательной")
+        keys.add(key)
+        services.append(Service(key, name, duration_minutes, price_value))
+    return tuple(services)
+
+
+SERVICES: Tuple[Service, ...] = parse_services(SERVICES_SPEC) or (
+    Service(DEFAULT_SERVICE_KEY, SERVICE_NAME, int(SERVICE_DURATION_HOURS * 60), SERVICE_PRICE_RUB),
+)
+DEFAULT_SERVICE = SERVICES[0]
+
+_SERVICES_BY_KEY: Dict[str, Service] = {service.key: service for service in SERVICES}
+
+
+def get_service(key: Optional[str]) -> Service:
+    """Услуга по ключу; для старых записей без услуги и неизвестных ключей - услуга по умолчанию"""
+    return _SERVICES_BY_KEY.get(key, DEFAULT_SERVICE)
@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden
+
+from database.async_manager import AsyncDatabaseManager
+from database.models import Booking
+from utils.helpers import REMINDER_FORMATTERS
+
+logger = logging.getLogger(__name__)
+
+# Период пробуждения диспетчера напоминаний (секунды)
+REMINDER_DISPATCH_INTERVAL = int(os.getenv('REMINDER_DISPATCH_INTERVAL', '60'))
+# Напоминания, опоздавшие больше чем на это время (например, бот был выключен), не отправляются
+REMINDER_GRACE_PERIOD = int(os.getenv('REMINDER_GRACE_PERIOD', '3600'))
+
+# Ошибки, при которых напоминание не будет доставлено никогда:
+# пользователь заблокировал бота, чат не найден и т.п.
+PERMANENT_ERRORS = (Forbidden, BadRequest)
+# Причина закрытия напоминаний, не отправленных в течение REMINDER_GRACE_PERIOD
+EXPIRED_ERROR = 'Истек срок отправки'
+
+
+class ReminderDispatcher:
+    """Единый диспетчер напоминаний
+
+    Вместо отдельной задачи планировщика на каждое напоминание одна
+    периодическая задача выбирает наступившие напоминания пачками по
+    индексу due_at и отправляет их. Память не зависит от числа записей.
+    """
+
+    def __init__(self, db: AsyncDatabaseManager, sender=None,
+                 interval: int = REMINDER_DISPATCH_INTERVAL, batch_size: int = 100):
+        self.db = db
+        # OutboundSender с ограничением скорости; без него отправка идет напрямую через бота
+        self.sender = sender
+        self.interval = interval
+        self.batch_size = batch_size
+        self._running = set()
+
+    async def _send(self, bot, reminder) -> Optional[Exception]:
+        """Отправка одного напоминания; возвращает ошибку или None при успехе"""
+        booking = Booking(
+            user_id=reminder['user_id'], username=reminder['username'],
+            date=reminder['date'], time=reminder['time'],
+            contact_info=reminder['contact_info'], id=reminder['booking_id'],
+            service=reminder['service'], price=reminder['price']
+        )
+        try:
+            send_message = self.sender.send_message if self.sender else bot.send_message
+            await send_message(
+                chat_id=booking.user_id,
+                text=REMINDER_FORMATTERS[reminder['kind']](booking),
+                parse_mode='HTML'
+            )
+            return None
+        except Exception as e:
+            logger.error("Ошибка отправки напоминания %s пользователю %s: %s", reminder['id'], booking.user_id, e)
+            return e
+
+    async def run(self, context):
+        """Задача JobQueue: отправка всех наступивших напоминаний"""
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            now = time.time()
+            # Напоминания старше окна отправки больше не выбираются - закрываем их
+            expired = await self.db.expire_reminders(now - REMINDER_GRACE_PERIOD, EXPIRED_ERROR)
+            if expired:
+                logger.warning("Закрыто просроченных напоминаний: %s", expired)
+
+            while True:
+                reminders = await self.db.get_due_reminders(
+                    now - REMINDER_GRACE_PERIOD, now, self.batch_size
+                )
+                if not reminders:
+                    return
+
+                # Пачка отправляется параллельно, скорость ограничивает OutboundSender
+                results = await asyncio.gather(*[
+                    self._send(context.bot, reminder) for reminder in reminders
+                ])
+
+                sent_ids, failures, retries = [], [], []
+                for reminder, error in zip(reminders, results):
+                    if error is None:
+                        sent_ids.append(reminder['id'])
+                    elif isinstance(error, PERMANENT_ERRORS):
+                        # Бот заблокирован или чат не найден - повтор не поможет
+                        failures.append((reminder['id'], str(error)))
+                    else:
+                        # Временная ошибка: повтор с экспоненциальной задержкой, пока
+                        # напоминание не выйдет за REMINDER_GRACE_PERIOD; позже - закрываем
+                        next_attempt_at = now + 2 ** reminder['attempts'] * 30
+                        if next_attempt_at > reminder['due_at'] + REMINDER_GRACE_PERIOD:
+                            failures.append((reminder['id'], str(error)))
+                        else:
+                            retries.append((reminder['id'], str(error), next_attempt_at))
+
+                if sent_ids:
+                    await self.db.mark_reminders_sent(sent_ids)
+                if failures:
+                    await self.db.fail_reminders(failures)
+                if retries:
+                    await self.db.retry_reminders(retries)
+                logger.info(
+                    "Отправлено напоминаний: %s из %s (закрыто с ошибкой: %s, отложено: %s)",
+                    len(sent_ids), len(reminders), len(failures), len(retries)
+                )
+
+                # Все напоминания пачки обработаны и больше не выбираются,
+                # поэтому останавливаемся только на неполной пачке
+                if len(reminders) < self.batch_size:
+                    return
+
+        except Exception as e:
+            logger.error("Ошибка диспетчера напоминаний: %s", e)
+        finally:
+            self._running.discard(task)
+
+    async def join(self):
+        """Ожидание начатой рассылки
+
+        Отправленные напоминания отмечаются в БД после ответа отправителя,
+        поэтому отправитель и БД останавливаются только после этого.
+        Иначе напоминания будут отправлены повторно после перезапуска.
+        """
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from services.availability_cache import AvailabilityCache
+
+
+def test_concurrent_misses_share_one_load():
+    """Одновременные промахи по одному ключу объединяются в одну загрузку"""
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ['slot']
+
+    async def main():
+        cache = AvailabilityCache(ttl=60)
+        results = await asyncio.gather(*[cache.get_or_load('key', loader) for _ in range(20)])
+        assert all(result == ['slot'] for result in results)
+        # Следующий запрос обслуживается из кэша
+        assert await cache.get_or_load('key', loader) == ['slot']
+
+    asyncio.run(main())
+    assert calls == 1
+
+
+def test_error_is_shared_and_not_cached():
+    calls = 0
+
+    async def failing_loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError('calendar unavailable')
+
+    async def main():
+        cache = AvailabilityCache(ttl=60)
+        results = await asyncio.gather(
+            *[cache.get_or_load('key', failing_loader) for _ in range(5)], return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load('key', failing_loader)
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_invalidate_discards_load_started_before():
+    """Загрузка, начатая до инвалидации, не возвращает в кэш устаревшие слоты"""
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [calls]
+
+    async def main():
+        cache = AvailabilityCache(ttl=60)
+        pending = asyncio.ensure_future(cache.get_or_load('key', loader))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        assert await pending == [1]
+        assert await cache.get_or_load('key', loader) == [2]
+
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import random
+from datetime import datetime
+
+from pytz import timezone
+
+from calendar_api.busy_index import BusyIntervalIndex, event_interval
+
+MINSK = timezone('Europe/Minsk')
+
+
+def test_overlaps_matches_linear_scan():
+    """Бинарный поиск дает тот же ответ, что и проверка всех интервалов"""
+    rng = random.Random(0)
+    for _ in range(200):
+        intervals = []
+        index = BusyIntervalIndex()
+        for _ in range(rng.randint(0, 30)):
+            start = rng.uniform(0, 1000)
+            end = start + rng.uniform(-5, 100)
+            index.add_ts(start, end)
+            if end > start:
+                intervals.append((start, end))
+        assert len(index) == len(intervals)
+
+        for _ in range(50):
+            start = rng.uniform(-50, 1050)
+            end = start + rng.uniform(0.1, 80)
+            expected = [(s, e) for s, e in intervals if s < end and start < e]
+            assert index.overlaps_ts(start, end) == bool(expected)
+            assert sorted(index.between(start, end)) == sorted(expected)
+
+
+def test_adjacent_intervals_do_not_overlap():
+    index = BusyIntervalIndex()
+    index.add_ts(100, 200)
+    assert not index.overlaps_ts(200, 300)
+    assert not index.overlaps_ts(0, 100)
+    assert index.overlaps_ts(199, 300)
+
+
+def test_long_interval_covers_later_short_ones():
+    """Длинный ранний интервал учитывается через префиксный максимум окончаний"""
+    index = BusyIntervalIndex()
+    index.add_ts(0, 1000)
+    index.add_ts(10, 20)
+    index.add_ts(30, 40)
+    assert index.overlaps_ts(500, 600)
+    assert index.between(500, 600) == [(0, 1000)]
+
+
+def test_add_after_query_rebuilds_index():
+    index = BusyIntervalIndex()
+    index.add_ts(100, 200)
+    assert not index.overlaps_ts(300, 400)
+    index.add_ts(350, 360)
+    assert index.overlaps_ts(300, 400)
+
+
+def test_event_interval():
+    timed = {
+        'start': {'dateTime': '2030-01-10T10:00:00+03:00'},
+        'end': {'dateTime': '2030-01-10T11:30:00+03:00'},
+    }
+    start, end = event_interval(timed, MINSK)
+    assert (end - start).total_seconds() == 90 * 60
+
+    all_day = {'start': {'date': '2030-01-10'}, 'end': {'date': '2030-01-12'}}
+    start, end = event_interval(all_day, MINSK)
+    assert start == MINSK.localize(datetime(2030, 1, 10))
+    assert end == MINSK.localize(datetime(2030, 1, 12))
+
+    assert event_interval(dict(timed, transparency='transparent'), MINSK) is None
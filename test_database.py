@@ -0,0 +1,34 @@
+from database.manager import DatabaseManager
+from database.models import Booking
+
+
+def make_booking(time, duration_minutes, user_id=1):
+    return Booking(
+        user_id=user_id, username='user', date='2030-01-10', time=time,
+        contact_info='+375000000000', service='test', duration_minutes=duration_minutes
+    )
+
+
+def test_reserve_booking_rejects_overlap(tmp_path):
+    """Короткая запись не попадает внутрь длинной, начавшейся раньше"""
+    db = DatabaseManager(str(tmp_path / 'bookings.db'))
+    assert db.reserve_booking(make_booking('10:00', 90), {}) is not None
+    assert db.reserve_booking(make_booking('11:00', 30, user_id=2), {}) is None
+    # Откат транзакции: отклоненная запись и ее задача календаря не сохранились
+    assert db.get_booked_intervals('2030-01-10', '2030-01-10') == [('2030-01-10', '10:00', 90)]
+    assert len(db.get_due_outbox()) == 1
+
+
+def test_reserve_booking_accepts_adjacent(tmp_path):
+    """Запись, начинающаяся ровно в момент окончания другой, допускается"""
+    db = DatabaseManager(str(tmp_path / 'bookings.db'))
+    assert db.reserve_booking(make_booking('10:00', 90), {}) is not None
+    assert db.reserve_booking(make_booking('11:30', 30, user_id=2), {}) is not None
+    assert db.reserve_booking(make_booking('09:30', 30, user_id=3), {}) is not None
+
+
+def test_reserve_booking_ignores_cancelled(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'bookings.db'))
+    booking_id = db.reserve_booking(make_booking('10:00', 90), {})
+    db.cancel_booking(booking_id)
+    assert db.reserve_booking(make_booking('11:00', 30, user_id=2), {}) is not None
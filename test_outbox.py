@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from calendar_api.outbox import CALENDAR_OUTBOX_MAX_ATTEMPTS, CalendarOutboxWorker
+from database.manager import DatabaseManager
+from database.models import Booking
+
+
+class FakeCalendar:
+    """Календарь, отвечающий заранее заданными результатами"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def create_event(self, *args, **kwargs):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'bookings.db'))
+    booking = Booking(user_id=1, username='user', date='2030-01-10', time='10:00', contact_info='+375000000000')
+    db.reserve_booking(booking, {
+        'date': booking.date, 'time': booking.time,
+        'client_info': booking.username, 'contact_info': booking.contact_info
+    })
+    return db
+
+
+def outbox_row(db):
+    return db.conn.execute('SELECT attempts, next_attempt_at, last_error FROM calendar_outbox').fetchone()
+
+
+def test_failed_task_is_retried_with_backoff(db):
+    worker = CalendarOutboxWorker(FakeCalendar(None, RuntimeError('timeout')), db)
+
+    started = time.time()
+    worker.drain()
+    attempts, next_attempt_at, last_error = outbox_row(db)
+    assert attempts == 1
+    assert last_error == 'Календарь вернул ошибку'
+    assert next_attempt_at == pytest.approx(started + 2 * 5, abs=1)
+
+    # Задача не выбирается до срока повтора
+    worker.drain()
+    assert outbox_row(db)[0] == 1
+
+    db.conn.execute('UPDATE calendar_outbox SET next_attempt_at = 0')
+    db.conn.commit()
+    started = time.time()
+    worker.drain()
+    attempts, next_attempt_at, last_error = outbox_row(db)
+    assert attempts == 2
+    assert last_error == 'timeout'
+    assert next_attempt_at == pytest.approx(started + 4 * 5, abs=1)
+
+
+def test_backoff_becomes_daily_after_max_attempts(db):
+    db.conn.execute('UPDATE calendar_outbox SET attempts = 6, next_attempt_at = 0')
+    db.conn.commit()
+    worker = CalendarOutboxWorker(FakeCalendar(None, None), db)
+
+    started = time.time()
+    worker.drain()
+    assert outbox_row(db)[1] == pytest.approx(started + 2 ** 7 * 5, abs=1)
+
+    db.conn.execute('UPDATE calendar_outbox SET next_attempt_at = 0')
+    db.conn.commit()
+    started = time.time()
+    worker.drain()
+    attempts, next_attempt_at, _ = outbox_row(db)
+    assert attempts == CALENDAR_OUTBOX_MAX_ATTEMPTS
+    assert next_attempt_at == pytest.approx(started + 24 * 3600, abs=1)
+
+
+def test_successful_task_is_completed(db):
+    worker = CalendarOutboxWorker(FakeCalendar('event-1'), db)
+    worker.drain()
+    assert outbox_row(db) is None
+    assert db.conn.execute('SELECT event_id FROM bookings').fetchone() == ('event-1',)
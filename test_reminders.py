@@ -0,0 +1,124 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from telegram.error import Forbidden, NetworkError
+
+from database.async_manager import AsyncDatabaseManager
+from database.models import Booking
+from services.reminders import EXPIRED_ERROR, REMINDER_GRACE_PERIOD, ReminderDispatcher
+
+
+class FakeBot:
+    """Бот, который заблокирован пользователем 1 и не может достучаться до пользователя 2"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode):
+        if chat_id == 1:
+            raise Forbidden('bot was blocked by the user')
+        if chat_id == 2:
+            raise NetworkError('timeout')
+        self.sent.append(chat_id)
+
+
+def test_failed_reminders_do_not_block_the_queue(tmp_path):
+    db = AsyncDatabaseManager(str(tmp_path / 'bookings.db'))
+    now = time.time()
+    booking_ids = [
+        db.manager.save_booking(Booking(
+            user_id=user_id, username='user', date=f'2030-01-{user_id + 10}', time='10:00', contact_info='+375'
+        ))
+        for user_id in range(5)
+    ]
+    db.manager.add_reminders([(booking_id, 'day', now - 10) for booking_id in booking_ids])
+
+    bot = FakeBot()
+    # Пачки по 2: неудачи в первой пачке не останавливают отправку остальных
+    asyncio.run(ReminderDispatcher(db, batch_size=2).run(SimpleNamespace(bot=bot)))
+    assert sorted(bot.sent) == [0, 3, 4]
+
+    rows = dict(
+        (booking_id, row) for booking_id, *row in db.manager.conn.execute(
+            'SELECT booking_id, sent_at IS NOT NULL, attempts, last_error, next_attempt_at FROM reminders'
+        )
+    )
+    # Заблокированный бот: напоминание закрыто с ошибкой
+    assert rows[booking_ids[1]][:3] == [1, 1, 'bot was blocked by the user']
+    # Временная ошибка: повтор через 30 с
+    sent, attempts, last_error, next_attempt_at = rows[booking_ids[2]]
+    assert (sent, attempts, last_error) == (0, 1, 'timeout')
+    assert now + 25 < next_attempt_at < now + 40
+
+    # До срока повтора напоминание не выбирается
+    assert asyncio.run(db.get_due_reminders(now - 3600, time.time())) == []
+
+
+def test_retry_past_grace_window_closes_reminder(tmp_path):
+    """Повтор, который выходит за окно отправки, закрывает напоминание с последней ошибкой"""
+    db = AsyncDatabaseManager(str(tmp_path / 'bookings.db'))
+    now = time.time()
+    booking_id = db.manager.save_booking(Booking(
+        user_id=2, username='user', date='2030-01-12', time='10:00', contact_info='+375'
+    ))
+    # Напоминание почти вышло из окна: следующий повтор через 30 с был бы уже за ним
+    db.manager.add_reminders([(booking_id, 'day', now - REMINDER_GRACE_PERIOD + 10)])
+
+    asyncio.run(ReminderDispatcher(db).run(SimpleNamespace(bot=FakeBot())))
+
+    row = db.manager.conn.execute(
+        'SELECT sent_at IS NOT NULL, attempts, last_error, next_attempt_at FROM reminders'
+    ).fetchone()
+    assert row == (1, 1, 'timeout', None)
+
+
+def test_stale_pending_reminders_are_expired(tmp_path):
+    """Напоминания старше окна отправки (простой бота, отмена записи) закрываются"""
+    db = AsyncDatabaseManager(str(tmp_path / 'bookings.db'))
+    now = time.time()
+    stale_id, cancelled_id = [
+        db.manager.save_booking(Booking(
+            user_id=user_id, username='user', date=f'2030-01-{user_id + 10}', time='10:00', contact_info='+375'
+        ))
+        for user_id in (3, 4)
+    ]
+    db.manager.update_booking_status(cancelled_id, 'cancelled')
+    db.manager.add_reminders([
+        (stale_id, 'day', now - REMINDER_GRACE_PERIOD - 60),
+        (cancelled_id, 'day', now - REMINDER_GRACE_PERIOD - 60),
+    ])
+
+    bot = FakeBot()
+    asyncio.run(ReminderDispatcher(db).run(SimpleNamespace(bot=bot)))
+
+    assert bot.sent == []
+    assert db.manager.conn.execute(
+        'SELECT COUNT(*) FROM reminders WHERE sent_at IS NULL'
+    ).fetchone() == (0,)
+    assert {error for error, in db.manager.conn.execute('SELECT last_error FROM reminders')} == {EXPIRED_ERROR}
+
+
+def test_join_waits_for_running_dispatch(tmp_path):
+    """join() дожидается начатой рассылки, и отправленное напоминание отмечается до закрытия БД"""
+    db = AsyncDatabaseManager(str(tmp_path / 'bookings.db'))
+    booking_id = db.manager.save_booking(Booking(
+        user_id=3, username='user', date='2030-01-13', time='10:00', contact_info='+375'
+    ))
+    db.manager.add_reminders([(booking_id, 'day', time.time() - 10)])
+
+    class SlowBot(FakeBot):
+        async def send_message(self, chat_id, text, parse_mode):
+            await asyncio.sleep(0.05)
+            await super().send_message(chat_id, text, parse_mode)
+
+    async def scenario():
+        dispatcher = ReminderDispatcher(db)
+        # Как JobQueue.stop(): задача уже запущена, и ее никто не ждет
+        asyncio.create_task(dispatcher.run(SimpleNamespace(bot=SlowBot())))
+        await asyncio.sleep(0)
+        await dispatcher.join()
+
+    asyncio.run(scenario())
+    assert db.manager.conn.execute('SELECT sent_at IS NOT NULL FROM reminders').fetchone() == (1,)
+    asyncio.run(db.close())
@@ -0,0 +1,45 @@
+import asyncio
+
+from bot.sender import OutboundSender
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+        return text
+
+
+def test_busy_chat_does_not_block_other_chats():
+    """Пока чат ждет свой токен, единственный обработчик отправляет сообщения других чатов"""
+    async def scenario():
+        bot = RecordingBot()
+        sender = OutboundSender(global_rate=1000, chat_rate=5, workers=1)
+        sender.start(bot)
+        results = await asyncio.gather(
+            sender.send_message(1, 'a1'), sender.send_message(1, 'a2'),
+            sender.send_message(1, 'a3'), sender.send_message(2, 'b1')
+        )
+        await sender.stop()
+        return bot.sent, results
+
+    sent, results = asyncio.run(scenario())
+    assert results == ['a1', 'a2', 'a3', 'b1']
+    # b1 не ждет, пока уйдут a2 и a3; сообщения одного чата идут по порядку
+    assert sent == [(1, 'a1'), (2, 'b1'), (1, 'a2'), (1, 'a3')]
+
+
+def test_stop_waits_for_deferred_messages():
+    async def scenario():
+        bot = RecordingBot()
+        sender = OutboundSender(global_rate=1000, chat_rate=10, workers=2)
+        sender.start(bot)
+        tasks = [asyncio.create_task(sender.send_message(1, str(i))) for i in range(3)]
+        await asyncio.sleep(0)
+        await sender.stop()
+        assert all(task.done() for task in tasks)
+        return bot.sent
+
+    assert asyncio.run(scenario()) == [(1, '0'), (1, '1'), (1, '2')]
@@ -0,0 +1,78 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from pytz import timezone
+
+from calendar_api.busy_index import BusyIntervalIndex
+from calendar_api.slots import WeeklySlotTemplate, fit_mask
+
+# Период включает переход на летнее время в Берлине (29.03.2026)
+TODAY = date(2026, 3, 20)
+DAYS_AHEAD = 14
+
+
+def brute_force_available(template, busy_index, duration):
+    """Эталон: проверка каждого слота по индексу занятости"""
+    quanta = template.quanta(duration)
+    result = []
+    for day_slots in template.days(TODAY, DAYS_AHEAD):
+        for i, start in enumerate(day_slots.starts):
+            if i + quanta > len(day_slots.starts):
+                break
+            if not busy_index.overlaps_ts(start, start + quanta * day_slots.quantum):
+                result.append(day_slots.slots[i])
+    return result
+
+
+def random_busy_index(template, rng):
+    busy_index = BusyIntervalIndex()
+    for day_slots in template.days(TODAY, DAYS_AHEAD):
+        for _ in range(rng.randint(0, 6)):
+            start = day_slots.start_ts + rng.randint(-120, 600) * 60
+            busy_index.add_ts(start, start + rng.randint(1, 180) * 60)
+    return busy_index
+
+
+@pytest.mark.parametrize('tz_name', ['Europe/Minsk', 'Europe/Berlin'])
+@pytest.mark.parametrize('granularity', [15, 30, 60])
+def test_available_matches_brute_force(tz_name, granularity):
+    """Битовые маски дают тот же результат, что и перебор слотов"""
+    template = WeeklySlotTemplate(range(7), 10, 18, timezone(tz_name), granularity)
+    rng = random.Random(granularity)
+    for _ in range(20):
+        busy_index = random_busy_index(template, rng)
+        for minutes in (15, 30, 45, 60, 90, 180):
+            duration = timedelta(minutes=minutes)
+            assert template.available(TODAY, DAYS_AHEAD, busy_index, duration, 0) == \
+                brute_force_available(template, busy_index, duration)
+
+
+def test_fit_mask_matches_brute_force():
+    """fit_mask отмечает начала всех серий из quanta свободных квантов"""
+    rng = random.Random(0)
+    for _ in range(500):
+        width = rng.randint(1, 40)
+        free = rng.getrandbits(width)
+        for quanta in range(1, width + 2):
+            expected = 0
+            for i in range(width):
+                if all(free >> k & 1 for k in range(i, i + quanta)) and i + quanta <= width:
+                    expected |= 1 << i
+            assert fit_mask(free, quanta) == expected
+
+
+def test_free_mask_marks_partially_busy_quanta():
+    """Квант занят, если занятость задевает его хотя бы частично"""
+    template = WeeklySlotTemplate(range(7), 10, 12, timezone('Europe/Minsk'), 30)
+    day_slots = template.day(TODAY)
+    busy_index = BusyIntervalIndex()
+    busy_index.add_ts(day_slots.start_ts + 40 * 60, day_slots.start_ts + 50 * 60)
+    assert day_slots.free_mask(busy_index) == 0b1101
+
+
+def test_not_before_excludes_past_slots():
+    template = WeeklySlotTemplate(range(7), 10, 18, timezone('Europe/Minsk'), 60)
+    first_day = template.days(TODAY, DAYS_AHEAD)[0]
+    slots = template.available(TODAY, DAYS_AHEAD, BusyIntervalIndex(), timedelta(hours=1), first_day.starts[3])
+    assert slots[0] is first_day.slots[4]
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from bot.concurrency import PerUserUpdateProcessor
+from bot.webhook import WebhookApp
+from tools.webhook_harness import make_message_update
+
+
+async def post(app: WebhookApp, payload: dict) -> int:
+    """Один POST-запрос к ASGI-приложению; возвращает код ответа"""
+    body = json.dumps(payload).encode()
+    scope = {'type': 'http', 'path': '/telegram', 'method': 'POST', 'headers': []}
+    received = iter([{'type': 'http.request', 'body': body, 'more_body': False}])
+    sent = []
+
+    async def receive():
+        return next(received)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status']
+
+
+def test_webhook_returns_503_when_too_many_updates_in_flight():
+    """Медленные обновления разных пользователей не копятся без ограничения"""
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+        application = SimpleNamespace(update_queue=asyncio.Queue(), update_processor=processor, bot=None)
+        release = asyncio.Event()
+        tasks = []
+
+        async def fetcher():
+            # Как Application с concurrent_updates: обновление сразу снимается с очереди
+            while True:
+                update = await application.update_queue.get()
+                tasks.append(asyncio.create_task(processor.process_update(update, release.wait())))
+
+        fetcher_task = asyncio.create_task(fetcher())
+        app = WebhookApp(application, max_pending=3)
+
+        statuses = []
+        for user_id in range(5):
+            statuses.append(await post(app, make_message_update(user_id, 'hello')))
+            await asyncio.sleep(0)
+
+        assert application.update_queue.qsize() == 0
+        assert statuses == [200, 200, 200, 503, 503]
+
+        # После обработки обновления снова принимаются
+        release.set()
+        await asyncio.gather(*tasks)
+        assert processor.pending_updates == 0
+        assert await post(app, make_message_update(10, 'hello')) == 200
+
+        fetcher_task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_webhook_rejects_oversized_body():
+    application = SimpleNamespace(
+        update_queue=asyncio.Queue(), update_processor=PerUserUpdateProcessor(), bot=None
+    )
+    app = WebhookApp(application, max_body=64)
+    assert asyncio.run(post(app, make_message_update(1, 'x' * 100))) == 413
@@ -0,0 +1,365 @@
+"""Офлайн нагрузочный тест бота
+
+Прогоняет через BotHandlers тысячи синтетических пользователей по сценарию
+/start → запись → услуга → дата → время → контакт → подтверждение. Вместо Telegram Bot API
+используется локальная заглушка BaseRequest, вместо Google Calendar - сервис
+в памяти, поэтому сеть и ключи не нужны. База данных создается во временном
+каталоге. В конце выводятся p50/p95/p99 задержки и пропускная способность
+по каждому шагу.
+
+    python -m tools.load_harness --users 2000 --concurrency 200
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httplib2
+from pytz import timezone, utc
+from googleapiclient.errors import HttpError
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest, RequestData
+
+from config import WORKING_DAYS, WORKING_HOURS_START, WORKING_HOURS_END, DAYS_AHEAD_BOOKING
+from bot.handlers import BotHandlers
+from bot.concurrency import PerUserUpdateProcessor
+from calendar_api.manager import GoogleCalendarManager
+from main import register_handlers, schedule_jobs
+from utils.profiling import trace_section
+from tools.webhook_harness import make_message_update, make_callback_update, percentile
+
+STEPS = ('start', 'book_appointment', 'select_service', 'select_date', 'select_time', 'contact', 'confirm_booking')
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Заглушка Telegram Bot API
+
+    Отвечает на запросы бота правдоподобными объектами и запоминает последнее
+    сообщение и клавиатуру каждого чата, чтобы виртуальный пользователь мог
+    нажать одну из предложенных кнопок.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.texts: Dict[int, str] = {}
+        self.markups: Dict[int, dict] = {}
+        self._message_ids = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            with trace_section('telegram'):
+                await asyncio.sleep(self.latency)
+
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+        elif endpoint in ('sendMessage', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            self.texts[chat_id] = params.get('text', '')
+            self.markups[chat_id] = params.get('reply_markup') or {}
+            self._message_ids += 1
+            result = {
+                'message_id': params.get('message_id', self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        else:
+            result = True
+
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def buttons(self, chat_id: int, prefix: str) -> List[str]:
+        """callback_data кнопок последней клавиатуры чата с заданным префиксом"""
+        keyboard = self.markups.get(chat_id, {}).get('inline_keyboard', [])
+        return [
+            button['callback_data'] for row in keyboard for button in row
+            if button.get('callback_data', '').startswith(prefix)
+        ]
+
+
+def _http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({'status': status}), b'{}')
+
+
+def _parse_time(value: dict) -> datetime:
+    dt = datetime.fromisoformat(value['dateTime'])
+    if dt.tzinfo is None:
+        dt = timezone(value.get('timeZone', 'UTC')).localize(dt)
+    return dt
+
+
+class _Call:
+    """Отложенный вызов API с методом execute(), как в googleapiclient"""
+
+    def __init__(self, service: 'FakeCalendarService', method: str, func):
+        self.service = service
+        self.method = method
+        self.func = func
+
+    def execute(self):
+        self.service.calls[self.method] += 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        with self.service.lock:
+            return self.func()
+
+
+class FakeCalendarService:
+    """Календарь в памяти с интерфейсом freebusy/events клиента Google
+
+    Поддерживает то подмножество API, которое использует GoogleCalendarManager:
+    freebusy.query, events.list (с syncToken), events.insert и events.delete.
+    Вызовы выполняются в потоках пула так же, как настоящие, с задержкой latency.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        # id -> (событие, версия изменения, start_ts, end_ts); удаленные остаются со status=cancelled
+        self._events: Dict[str, tuple] = {}
+        self._version = 0
+
+    def _put(self, event: dict):
+        self._version += 1
+        start, end = _parse_time(event['start']), _parse_time(event['end'])
+        self._events[event['id']] = (event, self._version, start.timestamp(), end.timestamp())
+
+    def seed(self, count: int):
+        """Случайные занятые часы в рабочее время горизонта бронирования"""
+        tz = timezone('Europe/Minsk')
+        today = datetime.now(tz).date()
+        days = [
+            today + timedelta(days=day) for day in range(1, DAYS_AHEAD_BOOKING + 1)
+            if (today + timedelta(days=day)).weekday() in WORKING_DAYS
+        ]
+        for i in range(count if days else 0):
+            day = random.choice(days)
+            start = tz.localize(datetime(day.year, day.month, day.day,
+                                         random.randrange(WORKING_HOURS_START, WORKING_HOURS_END)))
+            self._put({
+                'id': f'seed{i}', 'status': 'confirmed',
+                'start': {'dateTime': start.isoformat()},
+                'end': {'dateTime': (start + timedelta(hours=1)).isoformat()},
+            })
+
+    def freebusy(self):
+        return self
+
+    def events(self):
+        return self
+
+    def query(self, body: dict, fields: str = None) -> _Call:
+        def run():
+            time_min = datetime.fromisoformat(body['timeMin']).timestamp()
+            time_max = datetime.fromisoformat(body['timeMax']).timestamp()
+            busy = [
+                {
+                    'start': datetime.fromtimestamp(start, utc).isoformat(),
+                    'end': datetime.fromtimestamp(end, utc).isoformat(),
+                }
+                for event, _, start, end in self._events.values()
+                if event.get('status') != 'cancelled' and start < time_max and end > time_min
+            ]
+            return {'calendars': {item['id']: {'busy': busy} for item in body['items']}}
+        return _Call(self, 'freebusy.query', run)
+
+    def list(self, syncToken: str = None, pageToken: str = None, **params) -> _Call:
+        def run():
+            since = int(syncToken) if syncToken else 0
+            items = [
+                event for event, version, _, _ in self._events.values()
+                if version > since and (since or event.get('status') != 'cancelled')
+            ]
+            return {'items': items, 'nextSyncToken': str(self._version)}
+        return _Call(self, 'events.list', run)
+
+    def insert(self, calendarId: str, body: dict) -> _Call:
+        def run():
+            event = dict(body, status='confirmed')
+            event.setdefault('id', f'evt{self._version + 1}')
+            if event['id'] in self._events:
+                raise _http_error(409)
+            self._put(event)
+            return event
+        return _Call(self, 'events.insert', run)
+
+    def delete(self, calendarId: str, eventId: str) -> _Call:
+        def run():
+            stored = self._events.get(eventId)
+            if stored is None or stored[0].get('status') == 'cancelled':
+                raise _http_error(404)
+            self._put(dict(stored[0], status='cancelled'))
+        return _Call(self, 'events.delete', run)
+
+
+class FakeCalendarManager(GoogleCalendarManager):
+    """GoogleCalendarManager, работающий с FakeCalendarService вместо Google"""
+
+    def __init__(self, fake_service: FakeCalendarService):
+        super().__init__()
+        self._fake_service = fake_service
+
+    @property
+    def service(self):
+        return self._fake_service
+
+
+async def run_user(application: Application, telegram: FakeTelegramRequest, user_id: int,
+                   latencies: Dict[str, List[float]], outcomes: Counter):
+    """Один виртуальный пользователь проходит сценарий записи"""
+
+    async def send(step: str, data: dict):
+        update = Update.de_json(data, application.bot)
+        started = time.perf_counter()
+        # Тот же путь, что и у обновлений из очереди Application
+        await application.update_processor.process_update(update, application.process_update(update))
+        latencies[step].append(time.perf_counter() - started)
+
+    await send('start', make_message_update(user_id, '/start'))
+    await send('book_appointment', make_callback_update(user_id, 'book_appointment'))
+
+    services = telegram.buttons(user_id, 'select_service_')
+    if services:
+        # Несколько услуг (SERVICES) - сначала выбор услуги
+        await send('select_service', make_callback_update(user_id, random.choice(services)))
+
+    dates = telegram.buttons(user_id, 'select_date_')
+    if not dates:
+        outcomes['no_slots'] += 1
+        return
+    await send('select_date', make_callback_update(user_id, random.choice(dates)))
+
+    times = telegram.buttons(user_id, 'select_time_')
+    if not times:
+        outcomes['no_slots'] += 1
+        return
+    await send('select_time', make_callback_update(user_id, random.choice(times)))
+    if 'занят' in telegram.texts.get(user_id, ''):
+        # Слот успели занять, пока пользователь выбирал время
+        outcomes['slot_taken'] += 1
+        return
+
+    await send('contact', make_message_update(user_id, f'User {user_id}, +7 900 {user_id % 10_000_000:07d}'))
+    await send('confirm_booking', make_callback_update(user_id, 'confirm_booking'))
+
+    text = telegram.texts.get(user_id, '')
+    if 'занят' in text:
+        outcomes['slot_taken'] += 1
+    elif text.startswith('❌'):
+        outcomes['error'] += 1
+    else:
+        outcomes['booked'] += 1
+
+
+async def run(users: int, concurrency: int, telegram_latency: float, google_latency: float,
+              seed_events: int) -> Dict[str, List[float]]:
+    telegram = FakeTelegramRequest(telegram_latency)
+    calendar = FakeCalendarService(google_latency)
+    calendar.seed(seed_events)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    outcomes = Counter()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handlers = BotHandlers(db_path=f'{tmp}/load_test.db', calendar_manager=FakeCalendarManager(calendar))
+        application = (
+            Application.builder()
+            .token('0:load-test')
+            .request(telegram)
+            .get_updates_request(telegram)
+            .concurrent_updates(PerUserUpdateProcessor())
+            .build()
+        )
+        register_handlers(application, handlers)
+        schedule_jobs(application, handlers)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(user_id: int):
+            async with semaphore:
+                await run_user(application, telegram, user_id, latencies, outcomes)
+
+        async with application:
+            await application.start()
+            started = time.perf_counter()
+            await asyncio.gather(*[limited(100_000 + i) for i in range(users)])
+            elapsed = time.perf_counter() - started
+            await application.stop()
+            await handlers.booking_service.calendar_outbox.join()
+
+        await handlers.booking_service.calendar.shutdown()
+        await handlers.booking_service.db.close()
+
+    total_updates = sum(len(values) for values in latencies.values())
+    print("=== НАГРУЗОЧНЫЙ ТЕСТ ===")
+    print(f"Пользователей: {users}, одновременно: {concurrency}, "
+          f"задержка Telegram/Google: {telegram_latency * 1000:.0f}/{google_latency * 1000:.0f} мс")
+    print(f"Обновлений: {total_updates} за {elapsed:.2f} с ({total_updates / elapsed:.0f} в секунду)")
+    print(f"Итоги: {dict(outcomes)}")
+    print(f"Вызовы Telegram: {dict(telegram.calls)}")
+    print(f"Вызовы Google: {dict(calendar.calls)}")
+    print()
+    print(f"{'Шаг':<18}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'в сек':>8}")
+    for step in STEPS:
+        values = sorted(latencies.get(step, []))
+        if not values:
+            continue
+        print(f"{step:<18}{len(values):>8}{percentile(values, 50) * 1000:>10.1f}"
+              f"{percentile(values, 95) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}"
+              f"{len(values) / elapsed:>8.0f}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест сценария записи")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="Задержка Bot API, с")
+    parser.add_argument('--google-latency', type=float, default=0.1, help="Задержка Google Calendar, с")
+    parser.add_argument('--seed-events', type=int, default=20, help="Занятых часов в календаре")
+    parser.add_argument('--max-p95-ms', type=float, default=None,
+                        help="Завершиться с ошибкой, если p95 любого шага выше порога")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    latencies = asyncio.run(run(
+        args.users, args.concurrency, args.telegram_latency, args.google_latency, args.seed_events
+    ))
+
+    if args.max_p95_ms is not None:
+        slow = [
+            step for step, values in latencies.items()
+            if percentile(sorted(values), 95) * 1000 > args.max_p95_ms
+        ]
+        if slow:
+            print(f"\np95 выше {args.max_p95_ms} мс: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Локальный стенд для проверки режима webhook
+
+Отправляет синтетические обновления Telegram на запущенный webhook-сервер
+(BOT_MODE=webhook, WEBHOOK_URL пустой) и выводит задержку ответа сервера.
+
+    python -m tools.webhook_harness --count 1000 --concurrency 50
+"""
+import time
+import asyncio
+import argparse
+from itertools import count
+
+import httpx
+
+_update_ids = count(1)
+
+
+def make_user(user_id: int) -> dict:
+    """Синтетический пользователь Telegram"""
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+
+
+def make_message_update(user_id: int, text: str, message_id: int = 1) -> dict:
+    """Синтетическое обновление с текстовым сообщением"""
+    message = {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': make_user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': next(_update_ids), 'message': message}
+
+
+def make_callback_update(user_id: int, data: str, message_id: int = 1) -> dict:
+    """Синтетическое обновление с нажатием inline-кнопки"""
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': make_user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': '...',
+            },
+        },
+    }
+
+
+def percentile(values, p: float) -> float:
+    """Перцентиль p (0-100) отсортированного списка"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(url: str, secret: str, total: int, concurrency: int, users: int):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def post(client, update):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(url, json=update, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    updates = []
+    for i in range(total):
+        user_id = 100000 + i % users
+        updates.append(
+            make_message_update(user_id, '/start') if i % 2 == 0
+            else make_callback_update(user_id, 'help')
+        )
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30) as client:
+        await asyncio.gather(*[post(client, update) for update in updates])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print("=== WEBHOOK ===")
+    print(f"Отправлено обновлений: {total} за {elapsed:.2f} с ({total / elapsed:.0f} в секунду)")
+    print(f"Коды ответов: {statuses}")
+    print(f"Задержка p50/p95/p99: {percentile(latencies, 50) * 1000:.1f} / "
+          f"{percentile(latencies, 95) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка синтетических обновлений на webhook")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/telegram')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.secret, args.count, args.concurrency, args.users))
+
+
+if __name__ == "__main__":
+    main()
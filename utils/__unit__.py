@@ -1,3 +1,10 @@
-from .helpers import format_date, format_booking_list, schedule_booking_reminders
+from .helpers import (
+    format_date, format_booking_list, get_reminder_times, restore_booking_reminders,
+    format_day_reminder, format_hour_reminder
+)
+from .metrics import registry
 
-__all__ = ['format_date', 'format_booking_list', 'schedule_booking_reminders']
\ No newline at end of file
+__all__ = [
+    'format_date', 'format_booking_list', 'get_reminder_times', 'restore_booking_reminders',
+    'format_day_reminder', 'format_hour_reminder', 'registry'
+]
\ No newline at end of file
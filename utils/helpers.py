@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pytz import timezone
-from config import REMINDER_DAYS_BEFORE, REMINDER_HOURS_BEFORE, SERVICE_PRICE_RUB
+from config import REMINDER_DAYS_BEFORE, REMINDER_HOURS_BEFORE
 from database.models import Booking
+from services.catalog import get_service
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ def format_date(date_str: str) -> str:
         return f"{day} {month} ({weekday})"
 
     except Exception as e:
-        logger.error(f"Ошибка форматирования даты {date_str}: {e}")
+        logger.error("Ошибка форматирования даты %s: %s", date_str, e)
         return date_str
 
 def format_booking_list(bookings: List[Dict]) -> str:
@@ -58,81 +59,76 @@ def format_booking_list(bookings: List[Dict]) -> str:
             f"🕐 {booking['time']}\n"
             f"👤 {booking['contact_info']}\n"
             f"📋 {status}\n"
-            f"💰 {SERVICE_PRICE_RUB} руб.\n"
+            f"💰 {booking['price']} руб.\n"
         )
 
         formatted_bookings.append(booking_text)
 
     return "\n".join(formatted_bookings)
 
-async def schedule_booking_reminders(context, booking: Booking, booking_id: int):
-    """Планирование напоминаний о записи"""
-    try:
-        tz = timezone('Europe/Minsk')
-        # 2. Создаем "наивный" объект datetime
-        appointment_datetime_naive = datetime.strptime(f"{booking.date} {booking.time}", "%Y-%m-%d %H:%M")
-        # 3. Делаем его "осознающим" часовой пояс
-        appointment_datetime = tz.localize(appointment_datetime_naive)
-        #appointment_datetime = datetime.strptime(f"{booking.date} {booking.time}", "%Y-%m-%d %H:%M")
-        current_time = datetime.now(tz)
-
-        # Напоминание за день
-        reminder_day = appointment_datetime - timedelta(days=REMINDER_DAYS_BEFORE)
-        if reminder_day > current_time:
-            context.job_queue.run_once(
-                send_day_reminder,
-                reminder_day,
-                data={'booking_id': booking_id, 'booking': booking},
-                name=f"day_reminder_{booking_id}"
-            )
-            logger.info(f"Запланировано напоминание за день для записи {booking_id}")
-
-        # Напоминание за час
-        reminder_hour = appointment_datetime - timedelta(hours=REMINDER_HOURS_BEFORE)
-        if reminder_hour > current_time:
-            context.job_queue.run_once(
-                send_hour_reminder,
-                reminder_hour,
-                data={'booking_id': booking_id, 'booking': booking},
-                name=f"hour_reminder_{booking_id}"
-            )
-            logger.info(f"Запланировано напоминание за час для записи {booking_id}")
-
-    except Exception as e:
-        logger.error(f"Ошибка планирования напоминаний: {e}")
-
-async def send_day_reminder(context):
-    """Отправка напоминания за день"""
+def get_reminder_times(date: str, time: str) -> List[Tuple[str, datetime]]:
+    """Время отправки напоминаний о записи: (вид, момент отправки)"""
+    tz = timezone('Europe/Minsk')
+    appointment_datetime = tz.localize(datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M"))
+    return [
+        ('day', appointment_datetime - timedelta(days=REMINDER_DAYS_BEFORE)),
+        ('hour', appointment_datetime - timedelta(hours=REMINDER_HOURS_BEFORE)),
+    ]
+
+async def restore_booking_reminders(db) -> int:
+    """Дополнение напоминаний для будущих записей после перезапуска бота
+
+    Будущие подтвержденные записи читаются одним диапазонным запросом,
+    недостающие напоминания (например, у записей, созданных до появления
+    таблицы reminders) добавляются одной пакетной вставкой. Отправляет их
+    ReminderDispatcher.
+    """
+    current_time = datetime.now(timezone('Europe/Minsk'))
+    rows = await db.get_future_bookings_for_reminders(current_time.date().isoformat())
+
+    missing = []
+    for row in rows:
+        try:
+            for kind, due_at in get_reminder_times(row['date'], row['time']):
+                if kind not in row['reminder_kinds'] and due_at > current_time:
+                    missing.append((row['id'], kind, due_at.timestamp()))
+        except Exception as e:
+            logger.error("Ошибка восстановления напоминаний для записи %s: %s", row['id'], e)
+
+    if missing:
+        await db.add_reminders(missing)
+    logger.info("Восстановлено напоминаний: %s для %s записей", len(missing), len(rows))
+    return len(missing)
+
+def format_day_reminder(booking: Booking) -> str:
+    """Текст напоминания за день"""
     from config import ADMIN_CONTACT, PHONE_NUMBER
 
-    booking_data = context.job.data
-    booking = booking_data['booking']
-
     date_formatted = format_date(booking.date)
-
-    await context.bot.send_message(
-        chat_id=booking.user_id,
-        text=f"📅 <b>Напоминание!</b>\n\n"
-             f"Завтра у вас запланирована консультация:\n"
-             f"🗓 Дата: {date_formatted}\n"
-             f"🕐 Время: {booking.time}\n\n"
-             f"💰 Стоимость: {SERVICE_PRICE_RUB} руб.\n"
-             f"💳 Оплата администратору: {ADMIN_CONTACT}\n"
-             f"📱 Телефон: {PHONE_NUMBER}\n\n"
-             f"До встречи!",
-        parse_mode='HTML'
+    # Цена хранится в записи; для Booking без цены берется цена из каталога
+    price = booking.price if booking.price is not None else get_service(booking.service).price
+
+    return (
+        f"📅 <b>Напоминание!</b>\n\n"
+        f"Завтра у вас запланирована консультация:\n"
+        f"🗓 Дата: {date_formatted}\n"
+        f"🕐 Время: {booking.time}\n\n"
+        f"💰 Стоимость: {price} руб.\n"
+        f"💳 Оплата администратору: {ADMIN_CONTACT}\n"
+        f"📱 Телефон: {PHONE_NUMBER}\n\n"
+        f"До встречи!"
     )
 
-async def send_hour_reminder(context):
-    """Отправка напоминания за час"""
-    booking_data = context.job.data
-    booking = booking_data['booking']
-
-    await context.bot.send_message(
-        chat_id=booking.user_id,
-        text=f"⏰ <b>Напоминание!</b>\n\n"
-             f"Через час у вас консультация:\n"
-             f"🕐 Время: {booking.time}\n\n"
-             f"Увидимся скоро!",
-        parse_mode='HTML'
+def format_hour_reminder(booking: Booking) -> str:
+    """Текст напоминания за час"""
+    return (
+        f"⏰ <b>Напоминание!</b>\n\n"
+        f"Через час у вас консультация:\n"
+        f"🕐 Время: {booking.time}\n\n"
+        f"Увидимся скоро!"
     )
+
+REMINDER_FORMATTERS = {
+    'day': format_day_reminder,
+    'hour': format_hour_reminder,
+}
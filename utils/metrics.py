@@ -0,0 +1,200 @@
+import os
+import html
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+# Сбор метрик выключен по умолчанию; выключенные метрики почти ничего не стоят:
+# декораторы возвращают исходную функцию, observe/inc сразу выходят
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+
+# Границы корзин гистограмм (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_DISABLED_TIMER = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """Счетчик с одной меткой"""
+
+    def __init__(self, name: str, documentation: str, label: str):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_value, value in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+
+class Histogram:
+    """Гистограмма длительностей с одной меткой (ключ обработчика, метода, запроса)"""
+
+    def __init__(self, name: str, documentation: str, label: str,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        # label -> [счетчики корзин..., +Inf, сумма]
+        self._values: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = self._values.get(label_value)
+            if values is None:
+                values = self._values[label_value] = [0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-1] += seconds
+
+    @contextmanager
+    def _timer(self, label_value: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - started)
+
+    def time(self, label_value: str):
+        """Контекстный менеджер, измеряющий длительность блока"""
+        if not METRICS_ENABLED:
+            return _DISABLED_TIMER
+        return self._timer(label_value)
+
+    def timed(self, label_value: Optional[str] = None):
+        """Декоратор для синхронной функции; метка по умолчанию - имя функции"""
+        def decorator(func):
+            if not METRICS_ENABLED:
+                return func
+            key = label_value or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(key, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {label_value: list(values) for label_value, values in self._values.items()}
+
+    def quantile(self, values: List[float], q: float) -> float:
+        """Оценка квантиля сверху - граница корзины, в которую он попадает"""
+        count = sum(values[:-1])
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets, values):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_value, values in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += values[-2]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, label: str) -> Counter:
+        metric = Counter(name, documentation, label)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label: str,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def render_summary(self) -> str:
+        """Краткая сводка для команды /stats (HTML, значения меток экранируются)"""
+        if not METRICS_ENABLED:
+            return "Сбор метрик выключен (METRICS_ENABLED=1)"
+        lines = []
+        for metric in self._metrics:
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                if not snapshot:
+                    continue
+                lines.append(f"<b>{metric.name}</b>")
+                for label_value, values in sorted(snapshot.items()):
+                    count = int(sum(values[:-1]))
+                    average = values[-1] / count * 1000 if count else 0
+                    p95 = metric.quantile(values, 0.95) * 1000
+                    lines.append(f"{html.escape(label_value)}: {count} шт., ср. {average:.1f} мс, p95 ≤ {p95:g} мс")
+            else:
+                snapshot = metric.snapshot()
+                if not snapshot:
+                    continue
+                lines.append(f"<b>{metric.name}</b>")
+                lines.extend(f"{html.escape(label_value)}: {value:g}" for label_value, value in sorted(snapshot.items()))
+        return '\n'.join(lines) or "Метрик пока нет"
+
+
+registry = MetricsRegistry()
+
+UPDATE_SECONDS = registry.histogram(
+    'bot_update_seconds', 'Время обработки обновления Telegram', 'kind'
+)
+UPDATES_DROPPED = registry.counter(
+    'bot_updates_dropped_total', 'Отброшенные обновления', 'reason'
+)
+CALENDAR_SECONDS = registry.histogram(
+    'calendar_api_seconds', 'Время вызова Google Calendar API', 'method'
+)
+DB_SECONDS = registry.histogram(
+    'db_query_seconds', 'Время запроса к SQLite', 'query'
+)
+SENDER_EVENTS = registry.counter(
+    'sender_events_total', 'События очереди исходящих сообщений', 'event'
+)
@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Профилирование медленных обновлений выключено по умолчанию
+SLOW_UPDATE_PROFILING = os.getenv('SLOW_UPDATE_PROFILING', '0') == '1'
+# Обновления дольше порога записываются в файл трассировок (миллисекунды)
+SLOW_UPDATE_THRESHOLD_MS = float(os.getenv('SLOW_UPDATE_THRESHOLD_MS', '1000'))
+# Период снятия стека обрабатываемого обновления (секунды)
+SLOW_UPDATE_SAMPLE_INTERVAL = float(os.getenv('SLOW_UPDATE_SAMPLE_INTERVAL', '0.005'))
+SLOW_UPDATE_TRACE_FILE = os.getenv('SLOW_UPDATE_TRACE_FILE', 'slow_updates.log')
+SLOW_UPDATE_TRACE_MAX_BYTES = int(os.getenv('SLOW_UPDATE_TRACE_MAX_BYTES', str(5 * 1024 * 1024)))
+SLOW_UPDATE_TRACE_BACKUPS = int(os.getenv('SLOW_UPDATE_TRACE_BACKUPS', '3'))
+
+# Сколько разных стеков показывать в трассировке
+TOP_STACKS = 10
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_current_trace: ContextVar[Optional['UpdateTrace']] = ContextVar('current_update_trace', default=None)
+
+
+class UpdateTrace:
+    """Сведения об одном обрабатываемом обновлении"""
+
+    __slots__ = ('label', 'task', 'started', 'sections', 'samples')
+
+    def __init__(self, label: str, task: asyncio.Task):
+        self.label = label
+        self.task = task
+        self.started = time.perf_counter()
+        # раздел (telegram, google, sqlite) -> [число вызовов, суммарное время]
+        self.sections: Dict[str, List[float]] = {}
+        self.samples: Counter = Counter()
+
+    def add_section(self, name: str, seconds: float):
+        section = self.sections.setdefault(name, [0, 0.0])
+        section[0] += 1
+        section[1] += seconds
+
+    def format(self, elapsed: float) -> str:
+        lines = [f"=== {datetime.now().isoformat(timespec='seconds')} {elapsed * 1000:.0f} мс: {self.label}"]
+
+        accounted = 0.0
+        breakdown = []
+        for name, (calls, seconds) in sorted(self.sections.items()):
+            accounted += seconds
+            breakdown.append(f"{name} {seconds * 1000:.0f} мс ({calls} выз.)")
+        # Вызовы могут идти параллельно, тогда «прочее» меньше нуля не показываем
+        breakdown.append(f"прочее {max(elapsed - accounted, 0) * 1000:.0f} мс")
+        lines.append("Разбивка: " + ", ".join(breakdown))
+
+        total = sum(self.samples.values())
+        lines.append(f"Сэмплы стека: {total} (интервал {SLOW_UPDATE_SAMPLE_INTERVAL * 1000:g} мс)")
+        for stack, count in self.samples.most_common(TOP_STACKS):
+            lines.append(f"  {count:>5} ({count / total:.0%})")
+            lines.extend(f"        {frame}" for frame in stack)
+        return '\n'.join(lines) + '\n'
+
+
+def _frame_label(frame) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _await_stack(task: asyncio.Task) -> Tuple[str, ...]:
+    """Цепочка await задачи от обработчика до места ожидания"""
+    frames, handler_frames = [], None
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        if handler_frames is None and frame.f_code is _WRAPPER_CODE:
+            # Кадры диспетчера PTB выше обработчика не интересны
+            handler_frames = []
+        elif handler_frames is not None:
+            handler_frames.append(_frame_label(frame))
+        else:
+            frames.append(_frame_label(frame))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return tuple(handler_frames if handler_frames else frames)
+
+
+class _Sampler:
+    """Фоновый поток, периодически снимающий стеки обрабатываемых обновлений
+
+    Для асинхронного кода снимается не стек потока цикла событий (там может
+    выполняться другое обновление), а цепочка await самой задачи - она
+    показывает, чего именно ждет обновление: Telegram, Google или SQLite.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._traces: Dict[int, UpdateTrace] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, trace: UpdateTrace):
+        with self._lock:
+            self._traces[id(trace)] = trace
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='update-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, trace: UpdateTrace):
+        # Проход сэмплера идет под той же блокировкой, поэтому после remove()
+        # trace.samples больше не меняется и format() читает его безопасно
+        with self._lock:
+            self._traces.pop(id(trace), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._traces
+                for trace in self._traces.values():
+                    try:
+                        trace.samples[_await_stack(trace.task)] += 1
+                    except Exception:
+                        # Задача могла завершиться во время чтения стека
+                        pass
+            if idle:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler(SLOW_UPDATE_SAMPLE_INTERVAL)
+
+# Трассировки идут через корневой логгер в очередь логирования, а в свой
+# файл их направляет trace_log_handler() в потоке QueueListener
+TRACE_LOGGER_NAME = 'slow_updates'
+_trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+_trace_logger.setLevel(logging.INFO)
+
+
+def is_trace_record(record: logging.LogRecord) -> bool:
+    return record.name == TRACE_LOGGER_NAME
+
+
+def trace_log_handler() -> logging.Handler:
+    """Файл трассировок с ротацией; принимает только записи логгера slow_updates"""
+    handler = RotatingFileHandler(
+        SLOW_UPDATE_TRACE_FILE, maxBytes=SLOW_UPDATE_TRACE_MAX_BYTES,
+        backupCount=SLOW_UPDATE_TRACE_BACKUPS, encoding='utf-8'
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    handler.addFilter(is_trace_record)
+    return handler
+
+
+def _update_label(func, args) -> str:
+    update = next((arg for arg in args if isinstance(arg, Update)), None)
+    if update is None:
+        return func.__name__
+    user_id = update.effective_user.id if update.effective_user else None
+    if update.callback_query:
+        return f"{func.__name__} {update.callback_query.data} (пользователь {user_id})"
+    return f"{func.__name__} (пользователь {user_id})"
+
+
+def profile_slow_updates(func):
+    """Декоратор обработчика: трассировка обновлений дольше SLOW_UPDATE_THRESHOLD_MS"""
+    if not SLOW_UPDATE_PROFILING:
+        return func
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        trace = UpdateTrace(_update_label(func, args), asyncio.current_task())
+        token = _current_trace.set(trace)
+        _sampler.add(trace)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _sampler.remove(trace)
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started
+            if elapsed * 1000 >= SLOW_UPDATE_THRESHOLD_MS:
+                try:
+                    _trace_logger.info(trace.format(elapsed))
+                except Exception as e:
+                    logger.error("Не удалось записать трассировку медленного обновления: %s", e)
+    return wrapper
+
+
+# Код обертки profile_slow_updates, по нему в стеке ищется начало обработчика
+_WRAPPER_CODE = next(
+    const for const in profile_slow_updates.__code__.co_consts
+    if getattr(const, 'co_name', None) == 'wrapper'
+)
+
+
+@contextmanager
+def _section(trace: UpdateTrace, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_section(name, time.perf_counter() - started)
+
+
+def trace_section(name: str):
+    """Учет времени блока (вызова Telegram, Google, SQLite) в трассировке текущего обновления"""
+    if not SLOW_UPDATE_PROFILING:
+        return nullcontext()
+    trace = _current_trace.get()
+    if trace is None:
+        return nullcontext()
+    return _section(trace, name)
+
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, учитывающий время запросов к Bot API в трассировке обновления"""
+
+    async def do_request(self, *args, **kwargs):
+        with trace_section('telegram'):
+            return await super().do_request(*args, **kwargs)